@@ -0,0 +1,129 @@
+import os
+import atexit
+import datetime
+import threading
+from typing import List, Dict, Any
+
+from db import save_user_answers, get_question_summaries
+
+# -------------------------
+# Write-behind settings
+# -------------------------
+FLUSH_SIZE = 50             # Flush as soon as this many answers are buffered
+FLUSH_INTERVAL_SECONDS = 1.0  # ...or after this long, whichever comes first
+MAX_BUFFERED = 10000        # Beyond this, submit() writes through instead of buffering more
+# "buffered": answers are committed in the background (a crash can lose the last interval)
+# "sync": every answer is committed before submit() returns
+ANSWER_DURABILITY = os.getenv("ANSWER_DURABILITY", "buffered")
+
+# -------------------------
+# Buffered answer writer
+# -------------------------
+class AnswerWriter:
+    """Collects answers in memory and commits them in batches from a background thread."""
+
+    def __init__(self, flush_size: int = FLUSH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 durability: str = ANSWER_DURABILITY):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()   # Serializes the actual DB writes
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="answer-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, question_id: int, choice: str, correct: bool, user_id: str | None = None):
+        """Records one answer; returns immediately unless durability is 'sync'."""
+        # Capture the time now so batching doesn't shift it (same UTC format as CURRENT_TIMESTAMP)
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        row = (question_id, choice, bool(correct), timestamp, user_id)
+
+        if self.durability == "sync" or self._closed:
+            save_user_answers([row])
+            return
+
+        with self._lock:
+            overflow = len(self._buffer) >= MAX_BUFFERED
+            if not overflow:
+                self._buffer.append(row)
+                full = len(self._buffer) >= self.flush_size
+        if overflow:
+            # The DB is falling behind; apply back-pressure instead of growing without bound
+            save_user_answers([row])
+        elif full:
+            self._wake.set()
+
+    def flush(self):
+        """Commits everything buffered so far (blocking)."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                save_user_answers(batch)
+            except Exception as e:
+                print(f"Answer flush failed, will retry: {e}")
+                with self._lock:
+                    self._buffer[:0] = batch
+
+    def close(self):
+        """Stops the background thread and flushes what is left (called at interpreter exit)."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def pending_for(self, user_id: str) -> List[tuple]:
+        """This user's answers still waiting in the buffer, oldest first."""
+        with self._lock:
+            return [row for row in self._buffer if row[4] == user_id]
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+# Process-wide writer shared by every session
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_answer_writer() -> AnswerWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AnswerWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+def record_answer(question_id: int, choice: str, correct: bool, user_id: str | None = None):
+    """Queues a user's answer for a batched write (see ANSWER_DURABILITY)."""
+    get_answer_writer().submit(question_id, choice, correct, user_id)
+
+def pending_history(user_id: str) -> List[Dict[str, Any]]:
+    """The user's buffered answers in get_user_history()'s format, newest first.
+
+    Lets the history show an answer on the rerun right after it was given. An
+    answer whose batch is being committed at that moment can still be missing
+    for one rerun.
+    """
+    rows = get_answer_writer().pending_for(user_id)
+    if not rows:
+        return []
+    questions = get_question_summaries(sorted({row[0] for row in rows}))
+    history = []
+    for question_id, choice, correct, timestamp, _ in reversed(rows):
+        question, sub_category, answer = questions.get(question_id, (None, None, None))
+        history.append({
+            "id": None, "timestamp": timestamp, "choice": choice, "correct": correct,
+            "question": question, "sub_category": sub_category, "answer": answer
+        })
+    return history
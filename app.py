@@ -1,13 +1,22 @@
 import streamlit as st
 import datetime
-import json
-from db import create_tables, get_questions_by_date, save_questions, save_user_answer
-# REMOVED: from questions import get_questions (Imported locally below to break the circular dependency)
+import uuid
+from db import migrate, get_question_stats, get_topic_stats, get_user_history
+from answers import record_answer, pending_history
+from pool import start_prefetch_worker
+from daily import get_cached_questions, get_daily_questions, regenerate_daily_questions
+from practice import render_practice_page
+from metrics import span
+# REMOVED: from questions import get_questions (Imported locally in daily.py to break the circular dependency)
+
+# Times the whole rerun; ended explicitly before every st.stop() / st.rerun(), which abort the script
+rerun_span = span("app.rerun")
 
 # -------------------------
-# Initialize DB
+# Initialize DB (versioned migrations) and the background prefetch pool
 # -------------------------
-create_tables()
+migrate()  # Runs pending schema migrations once per process; later reruns skip it
+start_prefetch_worker()
 
 st.markdown("<h1>2<sup>Two</sup></h1>", unsafe_allow_html=True)
 st.write("Solve 2 Aptitude + 2 Technical Questions Daily!")
@@ -18,51 +27,65 @@ st.write("Solve 2 Aptitude + 2 Technical Questions Daily!")
 today = datetime.date.today().isoformat()
 
 # -------------------------
-# Utility function to convert DB row to app dictionary format
+# Anonymous user identity (kept in the URL so a bookmark restores the history)
 # -------------------------
-def format_db_row(row):
-    """Converts a SQLite row tuple into the app's dictionary format."""
-    # Columns: id, category, sub_category, question, options (JSON), correct_option, explanation
-    return {
-        "id": row[0],
-        "type": row[1],
-        "sub_category": row[2],
-        "question": row[3],
-        "options": json.loads(row[4]),  # Deserialize the JSON string back to a dict
-        "answer": row[5],              # Mapped from correct_option
-        "explanation": row[6]
-    }
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = st.query_params.get("u") or uuid.uuid4().hex[:12]
+    st.query_params["u"] = st.session_state.user_id
+user_id = st.session_state.user_id
+
+mode = st.sidebar.radio("Mode", ["Daily quiz", "Practice"])
 
 # -------------------------
-# Data Validation Utility
+# My past answers (keyset-paginated: only one page is ever loaded)
 # -------------------------
-def validate_questions_for_save(questions_list):
-    """Checks if mandatory fields required by the new DB schema are present."""
-    valid_questions = []
-    required_keys = ["type", "sub_category", "question", "options", "answer", "explanation"]
-    
-    for q in questions_list:
-        if all(key in q for key in required_keys):
-            valid_questions.append(q)
-        else:
-            print(f"Skipping malformed question due to missing keys: {q.keys()}")
-            
-    return valid_questions
+HISTORY_PAGE_SIZE = 10
+if 'history_cursors' not in st.session_state:
+    st.session_state.history_cursors = [None]   # Stack of page cursors; last one is the current page
+
+with st.sidebar:
+    st.subheader("My past answers")
+    st.caption(f"Your ID: `{user_id}` (bookmark this page to keep your history)")
+    history, next_cursor = get_user_history(user_id, st.session_state.history_cursors[-1], HISTORY_PAGE_SIZE)
+    if st.session_state.history_cursors[-1] is None:
+        # Answers still in the write-behind buffer are newer than anything committed
+        history = pending_history(user_id) + history
+    if not history:
+        st.write("No answers yet.")
+    for item in history:
+        mark = "✅" if item["correct"] else "❌"
+        st.write(f"{mark} {item['timestamp'][:10]} · *{item['sub_category'] or 'General'}*")
+        st.caption(f"{item['question'] or '(question removed)'} — you: {item['choice']}, correct: {item['answer'] or '?'}")
+    newer_col, older_col = st.columns(2)
+    if len(st.session_state.history_cursors) > 1 and newer_col.button("Newer"):
+        st.session_state.history_cursors.pop()
+        rerun_span.end("rerun")
+        st.rerun()
+    if next_cursor and older_col.button("Older"):
+        st.session_state.history_cursors.append(next_cursor)
+        rerun_span.end("rerun")
+        st.rerun()
 
 # -------------------------
-# Regenerate Questions Button (Forces new API call)
+# Practice mode (searchable bank; the daily quiz below is skipped)
+# -------------------------
+if mode == "Practice":
+    if render_practice_page():
+        rerun_span.end("rerun")
+        st.rerun()
+    rerun_span.end("stop")
+    st.stop()
+
+# -------------------------
+# Regenerate Questions Button (Swaps in a fresh pooled or generated set)
 # -------------------------
 if st.button("Regenerate Questions"):
-    from questions import get_questions # <-- Local import breaks the loop
-    new_questions = get_questions() 
-    
-    # Validation before saving
-    validated_questions = validate_questions_for_save(new_questions)
+    # Shared across sessions: everyone loading today's quiz afterwards gets the new set
+    validated_questions = regenerate_daily_questions(today)
     
     if not validated_questions or len(validated_questions) == 0:
         st.error("Failed to generate or validate new questions. Check console/fallback structure.")
     else:
-        save_questions(today, validated_questions, overwrite=True) 
         st.session_state.questions_cached = validated_questions
         st.success("Questions regenerated and saved!")
 
@@ -70,36 +93,37 @@ if st.button("Regenerate Questions"):
     st.session_state.answers = []
     st.session_state.submitted = False
     st.session_state.user_choice = None
+    rerun_span.end("rerun")
     st.rerun() 
 
 
 # -------------------------
-# Load questions 
+# Load questions (process-wide cache -> DB -> one shared generation)
 # -------------------------
 questions = []
 
 if 'questions_cached' not in st.session_state:
-    questions_db = get_questions_by_date(today)
-    if not questions_db:
+    questions = get_cached_questions(today)
+    if questions is None:
+        # Only the first session of the day (per process) actually waits here
         with st.spinner("Generating Fresh Questions via OpenRouter API..."):
-            from questions import get_questions # <-- Local import breaks the loop
-            questions = get_questions()
-            
-            # Validation before saving 
-            validated_questions = validate_questions_for_save(questions)
+            # Streamed generation: show each question as soon as the model finishes it
+            preview_slot = st.empty()
+            preview = preview_slot.container()
+
+            def show_preview(q):
+                with preview:
+                    st.markdown(f"**Q{q['id']} ready** · *{q['sub_category']}*: {q['question']}")
+                    st.caption("  |  ".join(f"{key}: {val}" for key, val in q["options"].items()))
+
+            questions = get_daily_questions(today, on_question=show_preview)
+            preview_slot.empty()
             
-            if not validated_questions or len(validated_questions) == 0:
+            if not questions or len(questions) == 0:
                 st.warning("Failed to generate and validate questions. Check console for structure errors. Cannot start quiz.")
+                rerun_span.end("stop")
                 st.stop()
-            
-            questions = validated_questions
-            save_questions(today, questions, overwrite=True)
-            st.session_state.questions_cached = questions
-            st.success("Fresh Questions are Ready!")
-    else:
-        # Load and deserialize questions from DB
-        questions = [format_db_row(row) for row in questions_db]
-        st.session_state.questions_cached = questions
+    st.session_state.questions_cached = questions
 
 else:
     questions = st.session_state.questions_cached
@@ -119,18 +143,34 @@ if 'user_choice' not in st.session_state:
     st.session_state.user_choice = None
 
 # -------------------------
-# Quiz Complete (Unchanged)
+# Quiz Complete (with community stats from the aggregate tables)
 # -------------------------
 if st.session_state.q_index >= total_questions:
     st.balloons()
     st.success("🎉 Quiz Completed! 🎉")
     st.write(f"Your Score: {sum(ans['correct'] for ans in st.session_state.answers)}/{total_questions}")
     st.write("Summary:")
+    question_stats = get_question_stats([q["id"] for q in questions])
     for ans in st.session_state.answers:
         q = next(q for q in questions if q["id"] == ans["id"])
         st.write(f"**Q{q['id']}: {q['question']}**")
         st.write(f"Your answer: {ans['choice']} | Correct: {q['answer']}")
+        stats = question_stats.get(q["id"])
+        if stats and stats["attempts"]:
+            most_picked = max(stats["choices"], key=stats["choices"].get)
+            st.caption(
+                f"{stats['correct'] / stats['attempts']:.0%} of {stats['attempts']} attempts were correct"
+                f" · most picked: {most_picked}"
+            )
         st.write(f"Explanation: {q['explanation']}")
+
+    with st.expander("Accuracy by topic"):
+        topic_stats = get_topic_stats()
+        if not topic_stats:
+            st.write("No answers recorded yet.")
+        for topic in topic_stats:
+            st.write(f"**{topic['sub_category']}**: {topic['correct'] / topic['attempts']:.0%} ({topic['attempts']} attempts)")
+    rerun_span.end("stop")
     st.stop()
 
 # -------------------------
@@ -169,8 +209,8 @@ if not st.session_state.submitted:
             correct = current_q["answer"]
             is_correct = choice_key == correct
 
-            # Save answer
-            save_user_answer(current_q["id"], choice_key, is_correct)
+            # Save answer (buffered write-behind; committed in batches off the rerun path)
+            record_answer(current_q["id"], choice_key, is_correct, user_id)
             st.session_state.answers.append({
                 "id": current_q["id"],
                 "choice": choice_key,
@@ -179,6 +219,7 @@ if not st.session_state.submitted:
 
             st.session_state.user_choice = choice_key
             st.session_state.submitted = True
+            rerun_span.end("rerun")
             st.rerun() 
 
 else:
@@ -201,4 +242,7 @@ else:
         st.session_state.q_index += 1
         st.session_state.submitted = False
         st.session_state.user_choice = None
+        rerun_span.end("rerun")
         st.rerun()
+
+rerun_span.end()
@@ -0,0 +1,188 @@
+"""Offline backfill: publishes the daily quiz for a range of future dates ahead of traffic.
+
+Usage:
+    python backfill.py                                  # today and the next 29 days
+    python backfill.py --start 2025-01-01 --days 90 --workers 4 --rate 10
+    python backfill.py --end 2025-03-31 --report backfill_report.json
+    python backfill.py --restart                        # forget the checkpoint, re-check every date
+
+Each day goes through the same path as a page load (bank, then prefetch pool,
+then live generation, validation, near-duplicate checks, generation lease,
+publish_questions and snapshot), except that a failed API call never publishes
+the sample questions: the day is left empty and retried by the next run.
+Finished dates are recorded in a checkpoint file, so an interrupted run resumes
+where it stopped. Days already in the database are never regenerated.
+
+Dates are started in order, but up to --workers of them are in flight at once,
+and those can't yet see each other's bank picks or questions in the
+near-duplicate index. Use --workers 1 for a strictly sequential run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any
+
+from db import migrate
+from daily import prepare_daily_questions
+from explainer import TokenBucket
+from llm import model_stats
+
+# -------------------------
+# Backfill settings
+# -------------------------
+DAYS = 30                               # Default range length, starting today
+WORKERS = 2                             # Dates generated concurrently
+RATE_PER_MINUTE = 10                    # Dates started per minute (a live day costs 1-3 API calls)
+BURST = 2
+CHECKPOINT_PATH = "backfill_checkpoint.json"
+DONE_STATUSES = {"generated", "existing", "incomplete"}   # Never retried; "failed" dates are
+
+# -------------------------
+# Checkpoint file
+# -------------------------
+class Checkpoint:
+    """Per-date outcomes, rewritten atomically after every finished date."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.dates: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if not restart and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.dates = json.load(f).get("dates", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable checkpoint {path}: {e}")
+
+    def is_done(self, date: str) -> bool:
+        return self.dates.get(date, {}).get("status") in DONE_STATUSES
+
+    def record(self, date: str, entry: Dict[str, Any]):
+        with self._lock:
+            self.dates[date] = entry
+            data = json.dumps({"updated": datetime.datetime.now().isoformat(timespec="seconds"),
+                               "dates": dict(sorted(self.dates.items()))}, indent=2)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".backfill-", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+# -------------------------
+# One date
+# -------------------------
+def backfill_date(date: str, bucket: TokenBucket) -> Dict[str, Any]:
+    """Makes sure date has a complete, published set; returns its checkpoint entry."""
+    from questions import missing_slots
+
+    bucket.acquire()
+    start = time.monotonic()
+    try:
+        questions, status = prepare_daily_questions(date)
+    except Exception as e:
+        print(f"Backfill of {date} crashed: {e}")
+        questions, status = [], "failed"
+    if questions and any(missing_slots(questions).values()):
+        # Published but short (the repair rounds ran out); replace it from the app if needed
+        status = "incomplete"
+    return {"status": status, "questions": len(questions), "seconds": round(time.monotonic() - start, 3)}
+
+def date_range(start: datetime.date, end: datetime.date) -> List[str]:
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+# -------------------------
+# Batch driver
+# -------------------------
+def run(dates: List[str], checkpoint: Checkpoint, workers: int = WORKERS,
+        rate_per_minute: float = RATE_PER_MINUTE) -> Dict[str, Any]:
+    """Backfills every date not already done in the checkpoint; returns the summary report."""
+    pending = [d for d in dates if not checkpoint.is_done(d)]
+    skipped = len(dates) - len(pending)
+    if skipped:
+        print(f"Resuming: {skipped} of {len(dates)} dates already done per {checkpoint.path}")
+
+    bucket = TokenBucket(rate_per_minute / 60.0, BURST)
+    start = time.monotonic()
+    interrupted = False
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+    try:
+        futures = {executor.submit(backfill_date, date, bucket): date for date in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            date = futures[future]
+            entry = future.result()
+            checkpoint.record(date, entry)
+            print(f"[{done}/{len(pending)}] {date}: {entry['status']} ({entry['questions']} questions, {entry['seconds']:.1f}s)")
+    except KeyboardInterrupt:
+        # Dates already running still finish; the next run finds them in the DB
+        print("Interrupted; rerun the same command to resume.")
+        interrupted = True
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    entries = {d: checkpoint.dates[d] for d in dates if d in checkpoint.dates}
+    statuses: Dict[str, int] = {}
+    for entry in entries.values():
+        statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+    timings = sorted(entry["seconds"] for d, entry in entries.items() if d in pending and entry["status"] == "generated")
+    return {
+        "start": dates[0] if dates else None,
+        "end": dates[-1] if dates else None,
+        "dates": len(dates),
+        "statuses": statuses,
+        "missing": [d for d in dates if d not in entries],
+        "failed": [d for d, entry in entries.items() if entry["status"] == "failed"],
+        "incomplete": [d for d, entry in entries.items() if entry["status"] == "incomplete"],
+        "generated_seconds_p50": timings[len(timings) // 2] if timings else None,
+        "generated_seconds_max": timings[-1] if timings else None,
+        "seconds": round(time.monotonic() - start, 3),
+        "interrupted": interrupted,
+        "models": model_stats(),
+    }
+
+def print_report(report: Dict[str, Any]):
+    counts = ", ".join(f"{count} {status}" for status, count in sorted(report["statuses"].items())) or "nothing done"
+    print(f"Backfill {report['start']} .. {report['end']} ({report['dates']} dates): {counts} in {report['seconds']:.1f}s")
+    if report["generated_seconds_p50"] is not None:
+        print(f"  generation time per date: p50 {report['generated_seconds_p50']:.1f}s, max {report['generated_seconds_max']:.1f}s")
+    for model, stats in report["models"].items():
+        latency = f"{stats['latency']:.2f}s" if stats["latency"] is not None else "n/a"
+        print(f"  {model}: {stats['attempts']} requests, {stats['success_rate']:.0%} ok, latency {latency}")
+    for key in ("failed", "incomplete", "missing"):
+        if report[key]:
+            print(f"  {key}: {', '.join(report[key])}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate and publish daily quizzes for a range of dates.")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="first date (YYYY-MM-DD, default today)")
+    range_group = parser.add_mutually_exclusive_group()
+    range_group.add_argument("--days", type=int, default=DAYS, help="number of dates from --start")
+    range_group.add_argument("--end", type=datetime.date.fromisoformat, help="last date (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="dates generated concurrently")
+    parser.add_argument("--rate", type=float, default=RATE_PER_MINUTE, help="max dates started per minute")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint (existing days are still kept)")
+    parser.add_argument("--report", help="also write the summary report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    end = args.end or args.start + datetime.timedelta(days=args.days - 1)
+    if end < args.start:
+        parser.error("the range ends before it starts")
+
+    migrate()
+    report = run(date_range(args.start, end), Checkpoint(args.checkpoint, args.restart),
+                 workers=args.workers, rate_per_minute=args.rate)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] or report["missing"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""Offline benchmark suite for the question pipeline and the DB layer.
+
+Usage:
+    python benchmarks/bench.py                      # run everything and print the report
+    python benchmarks/bench.py --save-baseline      # store the results as benchmarks/baseline.json
+    python benchmarks/bench.py --check              # exit 1 if a metric regressed against the baseline
+    python benchmarks/bench.py --quick --sizes 1000 10000 --latency 0.2
+
+Runs against a local fake OpenRouter server and a throwaway database, so it
+needs no API key or network. Baselines are machine-specific: save one on the
+machine that runs --check.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import datetime
+import contextlib
+from typing import List, Dict, Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_openrouter import FakeOpenRouter, FakeConfig
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# -------------------------
+# Suite settings
+# -------------------------
+ITERATIONS = {"llm": 30, "cpu": 500, "db": 200}
+QUICK_ITERATIONS = {"llm": 8, "cpu": 100, "db": 50}
+TABLE_SIZES = [1000, 10000, 100000]     # Rows in the questions table for the DB benchmarks
+REGRESSION_TOLERANCE = 0.25             # p50 may grow by this fraction before it counts as a regression
+NOISE_FLOOR_MS = 0.05                   # Absolute p50 growth below this is always ignored
+
+# -------------------------
+# Measurement helpers
+# -------------------------
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples: List[float], items_per_call: int = 1) -> Dict[str, float]:
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "n": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p90_ms": percentile(samples, 0.90) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "per_sec": len(samples) * items_per_call / total if total else 0.0,
+    }
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 3, items_per_call: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, items_per_call)
+
+# -------------------------
+# Pipeline stages (through the fake server)
+# -------------------------
+def bench_llm(server: FakeOpenRouter, iterations: int, results: Dict[str, Dict[str, float]]):
+    import llm
+    from questions import generate_questions, stream_questions, salvage_questions, get_questions
+
+    # Retries are part of the cost being measured, the sleeps between them are not
+    llm.BACKOFF_BASE_SECONDS = 0.001
+
+    for mode in ("valid", "fenced", "truncated", "garbage"):
+        # garbage is paired with valid so the retry path eventually succeeds
+        server.config.modes = {mode: 1.0} if mode != "garbage" else {"garbage": 0.5, "valid": 0.5}
+        results[f"llm.generate_questions[{mode}]"] = measure(generate_questions, iterations)
+
+    server.config.modes = {"valid": 1.0}
+    first_question = []
+
+    def stream_all():
+        start = time.perf_counter()
+        for index, _ in enumerate(stream_questions()):
+            if index == 0:
+                first_question.append(time.perf_counter() - start)
+
+    results["llm.stream_questions"] = measure(stream_all, iterations)
+    results["llm.stream_first_question"] = summarize(first_question[-iterations:])
+
+    text = json.dumps(generate_questions())
+    results["parse.salvage_questions[valid]"] = measure(lambda: salvage_questions(text), iterations * 10)
+    truncated = text[:len(text) - 200]
+    results["parse.salvage_questions[truncated]"] = measure(lambda: salvage_questions(truncated), iterations * 10)
+
+    # End to end: generation, validation, near-duplicate checks and repair rounds
+    results["pipeline.get_questions"] = measure(lambda: get_questions(fallback=False), iterations)
+
+def bench_cpu(iterations: int, results: Dict[str, Dict[str, float]]):
+    from fake_openrouter import fake_question
+    from questions import parse_questions, validate_questions_for_save
+
+    raw = [fake_question("aptitude"), fake_question("aptitude"), fake_question("technical"), fake_question("technical")]
+    results["cpu.parse_questions"] = measure(lambda: parse_questions(raw), iterations, items_per_call=len(raw))
+    results["cpu.validate_questions_for_save"] = measure(
+        lambda: validate_questions_for_save(raw), iterations, items_per_call=len(raw)
+    )
+
+# -------------------------
+# DB operations at increasing table sizes
+# -------------------------
+def _fill_questions_table(target_rows: int):
+    """Tops the questions table up to target_rows synthetic rows, four per past day."""
+    from fake_openrouter import fake_question
+    import db
+
+    with db.pooled_connection() as conn, conn:
+        existing = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        day = datetime.date(2000, 1, 1) + datetime.timedelta(days=existing // 4)
+        rows = []
+        for index in range(existing, target_rows):
+            q = fake_question("aptitude" if index % 4 < 2 else "technical")
+            rows.append((
+                (day + datetime.timedelta(days=(index - existing) // 4)).isoformat(),
+                q["type"], q["sub_category"], q["question"], json.dumps(q["options"]), q["answer"], q["explanation"]
+            ))
+        conn.executemany("""
+        INSERT INTO questions (date, category, sub_category, question, options, correct_option, explanation)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+def bench_db(sizes: List[int], iterations: int, results: Dict[str, Dict[str, float]]):
+    from fake_openrouter import fake_question
+    import db
+
+    questions = [fake_question("aptitude"), fake_question("aptitude"), fake_question("technical"), fake_question("technical")]
+    future = [datetime.date(2100, 1, 1)]
+
+    def save():
+        future[0] += datetime.timedelta(days=1)
+        db.save_questions(future[0].isoformat(), questions)
+
+    for size in sizes:
+        _fill_questions_table(size)
+        day = "2000-01-02"
+        rows = db.get_questions_by_date(day)
+        results[f"db.save_questions@{size}"] = measure(save, iterations, items_per_call=len(questions))
+        results[f"db.get_questions_by_date@{size}"] = measure(lambda: db.get_questions_by_date(day), iterations)
+        results[f"db.format_db_row@{size}"] = measure(
+            lambda: [db.format_db_row(row) for row in rows], iterations, items_per_call=len(rows)
+        )
+        results[f"db.search_questions@{size}"] = measure(
+            lambda: db.search_questions("stack queue", source="archive"), iterations
+        )
+
+# -------------------------
+# Report / baseline comparison
+# -------------------------
+def print_report(results: Dict[str, Dict[str, float]]):
+    print(f"{'metric':<42} {'n':>5} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'per sec':>12}")
+    for name, r in results.items():
+        print(f"{name:<42} {r['n']:>5} {r['p50_ms']:>10.3f} {r['p90_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['per_sec']:>12,.1f}")
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     tolerance: float = REGRESSION_TOLERANCE) -> List[str]:
+    """Metrics whose p50 grew by more than tolerance (and more than the noise floor)."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None or not before["p50_ms"]:
+            continue
+        growth = current["p50_ms"] - before["p50_ms"]
+        if growth > NOISE_FLOOR_MS and current["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {before['p50_ms']:.3f} -> {current['p50_ms']:.3f} ms (+{growth / before['p50_ms']:.0%})"
+            )
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the question pipeline offline.")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=TABLE_SIZES, help="questions-table sizes for the DB benchmarks")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake API latency in seconds")
+    parser.add_argument("--only", choices=["llm", "cpu", "db"], action="append", help="run only these groups")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output while measuring")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {os.path.relpath(BASELINE_PATH)}")
+    parser.add_argument("--check", action="store_true", help="compare against the baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="allowed p50 growth (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["llm", "cpu", "db"]
+    iterations = QUICK_ITERATIONS if args.quick else ITERATIONS
+
+    server = FakeOpenRouter(FakeConfig(latency=args.latency)).start()
+    # Set before llm.py / questions.py are imported: both read them once
+    os.environ["OPENROUTER_API_URL"] = server.url
+    os.environ["OPENROUTER_API_KEY"] = "benchmark"
+
+    import db
+    workdir = tempfile.mkdtemp(prefix="2two-bench-")
+    db.DB_NAME = os.path.join(workdir, "bench.db")
+
+    results: Dict[str, Dict[str, float]] = {}
+    # The pipeline logs with print(); keep it out of the report unless asked for
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with quiet:
+            db.migrate()
+            if "llm" in groups:
+                bench_llm(server, iterations["llm"], results)
+            if "cpu" in groups:
+                bench_cpu(iterations["cpu"], results)
+            if "db" in groups:
+                bench_db(sorted(args.sizes), iterations["db"], results)
+    finally:
+        server.stop()
+        db.close_all_connections()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_PATH}")
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"No baseline at {BASELINE_PATH}; run with --save-baseline first.")
+            return 1
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""Local stand-in for the OpenRouter chat completions endpoint (offline benchmarks and load tests).
+
+Usage:
+    python benchmarks/fake_openrouter.py --port 8765 --latency 0.5
+    python benchmarks/fake_openrouter.py --port 8765 --mode truncated=0.3 --mode garbage=0.1
+    OPENROUTER_API_URL=http://127.0.0.1:8765/api/v1/chat/completions OPENROUTER_API_KEY=x streamlit run app.py
+
+Answers question prompts with freshly worded questions in the requested
+aptitude/technical mix, explanation prompts with an explanation, and honours
+"stream": true with server-sent events.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any
+
+# -------------------------
+# Response modes
+# -------------------------
+# valid:     the JSON array the prompt asks for
+# fenced:    the array inside a ```json fence with trailing commas (salvage must repair it)
+# truncated: the array cut off inside its last question (salvage keeps the complete ones)
+# garbage:   HTTP 200 whose body is not a completion at all
+# error:     HTTP 503 (retryable)
+MODES = ("valid", "fenced", "truncated", "garbage", "error")
+
+_APTITUDE_RE = re.compile(r"(\d+) aptitude questions")
+_TECHNICAL_RE = re.compile(r"(\d+) technical questions")
+
+# Random question wording, so generated questions never look like near-duplicates of each other
+_WORDS = (
+    "array stack queue heap graph tree node edge cache page frame thread process mutex lock kernel "
+    "index table join query commit schema hash bucket pointer register buffer socket packet router "
+    "train speed distance ratio profit loss interest average mixture pipe cistern clock calendar "
+    "cube dice coin card circle triangle square cone sphere cylinder angle series term sum product"
+).split()
+_TOPICS = {
+    "aptitude": ["Probability", "Sequences & Series", "Directions", "Clocks & Calendars", "Geometry"],
+    "technical": ["Data Structures", "Algorithms", "Operating Systems", "Database Management Systems"],
+}
+
+class FakeConfig:
+    """Behaviour of the fake server; attributes may be changed while it runs."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, modes: Dict[str, float] | None = None,
+                 stream_chunk_chars: int = 40, stream_delay: float = 0.0):
+        self.latency = latency                      # Seconds before the first byte
+        self.jitter = jitter                        # +/- uniform seconds added to latency
+        self.modes = modes or {"valid": 1.0}        # Mode -> relative weight
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_delay = stream_delay            # Seconds between streamed chunks
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def pick_mode(self) -> str:
+        with self._lock:
+            self.requests += 1
+        modes = list(self.modes)
+        return random.choices(modes, weights=[self.modes[m] for m in modes])[0]
+
+# -------------------------
+# Fake content
+# -------------------------
+def fake_question(qtype: str) -> Dict[str, Any]:
+    words = random.sample(_WORDS, 10)
+    answer = random.choice("ABCD")
+    return {
+        "type": qtype,
+        "sub_category": random.choice(_TOPICS[qtype]),
+        # Non-ASCII on purpose: real aptitude questions are full of these symbols
+        "question": f"Which {' '.join(words)} statement holds for case {random.randrange(10 ** 6)} (√2 × π ≥ 4)?",
+        "options": {key: f"Option {key} {random.choice(_WORDS)} {random.randrange(1000)}" for key in "ABCD"},
+        "answer": answer,
+        "explanation": fake_explanation(),
+    }
+
+def fake_explanation() -> str:
+    return " ".join(random.choice(_WORDS) for _ in range(70)).capitalize() + "."
+
+def fake_content(prompt: str, mode: str) -> str:
+    """Message content for one completion in the given mode."""
+    if "Write the explanation" in prompt:
+        return fake_explanation()
+
+    aptitude = _APTITUDE_RE.search(prompt)
+    technical = _TECHNICAL_RE.search(prompt)
+    questions = (
+        [fake_question("aptitude") for _ in range(int(aptitude.group(1)) if aptitude else 2)]
+        + [fake_question("technical") for _ in range(int(technical.group(1)) if technical else 2)]
+    )
+    text = json.dumps(questions, indent=2, ensure_ascii=False)
+    if mode == "fenced":
+        return "Here are your questions:\n```json\n" + text.replace("\n  }", ",\n  }") + "\n```"
+    if mode == "truncated":
+        # Cut halfway into the last question
+        last = text.rfind("{")
+        return text[:last + (len(text) - last) // 2]
+    return text
+
+def _usage(prompt: str, content: str) -> Dict[str, int]:
+    # Rough 4-characters-per-token estimate, same shape as OpenRouter's usage block
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+# -------------------------
+# HTTP handler
+# -------------------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, like the real API behind the pooled session
+    disable_nagle_algorithm = True  # Otherwise small keep-alive responses stall ~40 ms on delayed ACKs
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config: FakeConfig = self.server.config
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        mode = config.pick_mode()
+        time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+        if mode == "error":
+            self._send(503, b'{"error": {"message": "fake upstream overloaded"}}')
+            return
+        if mode == "garbage":
+            self._send(200, b"<html>upstream error</html>", "text/html")
+            return
+
+        prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+        content = fake_content(prompt, mode)
+        model = payload.get("model", "fake/model")
+        if payload.get("stream"):
+            usage = _usage(prompt, content) if (payload.get("usage") or {}).get("include") else None
+            self._stream(model, content, usage)
+            return
+        body = {
+            "id": "fake-completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(prompt, content),
+        }
+        self._send(200, json.dumps(body).encode("utf-8"))
+
+    def _stream(self, model: str, content: str, usage: Dict[str, int] | None = None):
+        config: FakeConfig = self.server.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b": keep-alive\n\n")
+        step = config.stream_chunk_chars
+        for start in range(0, len(content), step):
+            event = {"model": model, "choices": [{"index": 0, "delta": {"content": content[start:start + step]}}]}
+            # Raw UTF-8 like the real API (json.dumps would hide decoding bugs behind \u escapes)
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if config.stream_delay:
+                time.sleep(config.stream_delay)
+        if usage:
+            # OpenRouter sends usage in a final chunk with no choices when asked for it
+            event = {"model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+# -------------------------
+# Server lifecycle
+# -------------------------
+class FakeOpenRouter:
+    """Runs the fake endpoint in a background thread (port 0 picks a free port)."""
+
+    def __init__(self, config: FakeConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeConfig()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.config = self.config
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self) -> "FakeOpenRouter":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openrouter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+def parse_modes(values: List[str]) -> Dict[str, float]:
+    """['truncated=0.3', 'garbage'] -> weights, with 'valid' taking whatever is left."""
+    modes = {}
+    for value in values:
+        name, _, weight = value.partition("=")
+        if name not in MODES:
+            raise ValueError(f"unknown mode {name!r} (choose from {', '.join(MODES)})")
+        modes[name] = float(weight) if weight else 1.0
+    if "valid" not in modes:
+        modes["valid"] = max(0.0, 1.0 - sum(modes.values()))
+    return modes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake OpenRouter chat completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--mode", action="append", default=[], metavar="MODE[=WEIGHT]",
+                        help=f"response mode mix ({', '.join(MODES)}); repeatable")
+    parser.add_argument("--stream-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    args = parser.parse_args(argv)
+
+    try:
+        modes = parse_modes(args.mode)
+    except ValueError as e:
+        parser.error(str(e))
+    config = FakeConfig(latency=args.latency, jitter=args.jitter, modes=modes, stream_delay=args.stream_delay)
+    server = FakeOpenRouter(config, args.host, args.port).start()
+    print(f"Fake OpenRouter listening on {server.url} (modes: {modes})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Concurrent-session load test for app.py (Streamlit AppTest sessions + the fake OpenRouter server).
+
+Usage:
+    python benchmarks/loadtest.py                          # 1, 2, 4, 8 and 16 concurrent users
+    python benchmarks/loadtest.py --users 4 16 32 --quizzes 3 --slo-ms 300
+    python benchmarks/loadtest.py --sync-answers           # every submit writes through to SQLite
+
+Each simulated user opens the app in its own session and takes the whole
+quiz: load -> (pick an option -> submit -> next) per question -> completion.
+Every rerun is timed. The report shows the latency distribution, write-lock
+waits and error rate at each concurrency level, so the level where one
+process stops keeping up is visible.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_openrouter import FakeOpenRouter, FakeConfig
+from bench import summarize
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# -------------------------
+# Load test settings
+# -------------------------
+USER_LEVELS = [1, 2, 4, 8, 16]
+QUIZZES_PER_USER = 2
+RERUN_TIMEOUT_SECONDS = 60      # AppTest's own default (3 s) would turn slow reruns into errors
+SLO_P90_MS = 500                # A level whose p90 rerun exceeds this is past the limit
+MAX_ERROR_RATE = 0.01
+
+# -------------------------
+# One simulated user
+# -------------------------
+class SessionRecorder:
+    """Collects rerun timings and errors from every simulated session (thread-safe)."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        self.reruns = 0
+        self._lock = threading.Lock()
+
+    def timed_run(self, step: str, run):
+        """Times one rerun; a failed rerun (or a script exception) aborts the user's flow."""
+        start = time.perf_counter()
+        try:
+            at = run()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.reruns += 1
+                self.samples.setdefault(step, []).append(elapsed)
+        if at.exception:
+            raise RuntimeError(f"{step}: script raised {at.exception[0].value}")
+        return at
+
+    def record_error(self, error: Exception):
+        with self._lock:
+            self.errors.append(f"{type(error).__name__}: {error}")
+
+def _share_apptest_runtime():
+    """Lets AppTest sessions run concurrently in one process.
+
+    Each AppTest run installs a mock Runtime singleton and clears it when it
+    finishes, which pulls it out from under runs still going on other
+    threads; keep serving the last one instead. Each run also compiles the
+    script itself, and concurrent ast.parse calls trip a CPython 3.11 bug;
+    share one compiled copy, as a real server's script cache does.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+
+    compiled = {}
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def shared_bytecode(self, script_path):
+        with compile_lock:
+            if script_path not in compiled:
+                compiled[script_path] = get_bytecode(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = shared_bytecode
+
+def _button(at, label: str):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"no {label!r} button on the page")
+
+def take_quiz(recorder: SessionRecorder):
+    """Loads the app in a fresh session and answers every question."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT_SECONDS)
+    recorder.timed_run("load", at.run)
+    index = 0
+    while not any("Quiz Completed" in str(s.value) for s in at.success):
+        radio = at.radio(key=f"radio_{index}")
+        radio.set_value(random.choice(radio.options))
+        recorder.timed_run("submit", _button(at, "Submit Answer").click().run)
+        recorder.timed_run("next", _button(at, "Next Question").click().run)
+        index += 1
+        if index > 20:
+            raise RuntimeError("quiz never completed")
+
+def _user(recorder: SessionRecorder, quizzes: int):
+    for _ in range(quizzes):
+        try:
+            take_quiz(recorder)
+        except Exception as e:
+            recorder.record_error(e)
+
+# -------------------------
+# Driver
+# -------------------------
+def run_level(users: int, quizzes: int) -> Dict[str, Any]:
+    import db
+    from answers import get_answer_writer
+
+    recorder = SessionRecorder()
+    db.reset_lock_stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="user") as executor:
+        for future in [executor.submit(_user, recorder, quizzes) for _ in range(users)]:
+            future.result()
+    # Buffered answers count towards this level's writes
+    get_answer_writer().flush()
+    elapsed = time.perf_counter() - start
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    return {
+        "users": users,
+        "reruns": recorder.reruns,
+        "reruns_per_sec": recorder.reruns / elapsed if elapsed else 0.0,
+        "rerun": summarize(all_samples) if all_samples else None,
+        "steps": {step: summarize(samples) for step, samples in recorder.samples.items()},
+        "errors": recorder.errors,
+        "error_rate": len(recorder.errors) / recorder.reruns if recorder.reruns else 0.0,
+        "locks": db.get_lock_stats(),
+    }
+
+def print_level(result: Dict[str, Any]):
+    rerun, locks = result["rerun"], result["locks"]
+    print(
+        f"{result['users']:>5} {result['reruns']:>7} {result['reruns_per_sec']:>9.1f} "
+        f"{rerun['p50_ms']:>9.1f} {rerun['p90_ms']:>9.1f} {rerun['p99_ms']:>9.1f} "
+        f"{locks['acquired']:>7} {locks['waited']:>6} {locks['max_wait_seconds'] * 1000:>9.1f} "
+        f"{result['error_rate']:>7.1%}"
+    )
+    for step, summary in result["steps"].items():
+        print(f"{'':>5} {step:>7} p50 {summary['p50_ms']:.1f} ms, p90 {summary['p90_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    for error in result["errors"][:3]:
+        print(f"{'':>5} error: {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app.py with concurrent simulated quiz takers.")
+    parser.add_argument("--users", type=int, nargs="+", default=USER_LEVELS, help="concurrency levels to run")
+    parser.add_argument("--quizzes", type=int, default=QUIZZES_PER_USER, help="quizzes each user takes per level")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake API latency in seconds")
+    parser.add_argument("--slo-ms", type=float, default=SLO_P90_MS, help="p90 rerun latency considered acceptable")
+    parser.add_argument("--sync-answers", action="store_true", help="write every answer through (ANSWER_DURABILITY=sync)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenRouter(FakeConfig(latency=args.latency)).start()
+    workdir = tempfile.mkdtemp(prefix="2two-load-")
+    # Set before the app's modules are imported: they read these once
+    os.environ["OPENROUTER_API_URL"] = server.url
+    os.environ["OPENROUTER_API_KEY"] = "loadtest"
+    os.environ["QUIZ_SNAPSHOT_DIR"] = os.path.join(workdir, "snapshots")
+    if args.sync_answers:
+        os.environ["ANSWER_DURABILITY"] = "sync"
+
+    import db
+    db.DB_NAME = os.path.join(workdir, "load.db")
+
+    from streamlit.testing.v1.util import patch_config_options
+    _share_apptest_runtime()
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    results = []
+    # Held for the whole run: concurrent AppTest runs patch and restore this option out of order
+    app_test_mode = patch_config_options({"global.appTest": True})
+    app_test_mode.__enter__()
+    try:
+        # Warm-up session: migrates, generates and publishes today's set outside the measurements
+        with quiet:
+            take_quiz(SessionRecorder())
+        print(f"{'users':>5} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+              f"{'writes':>7} {'waits':>6} {'max wait':>9} {'errors':>7}")
+        for users in args.users:
+            with quiet:
+                result = run_level(users, args.quizzes)
+            results.append(result)
+            print_level(result)
+    finally:
+        app_test_mode.__exit__(None, None, None)
+        server.stop()
+
+    within = [r["users"] for r in results
+              if r["rerun"] and r["rerun"]["p90_ms"] <= args.slo_ms and r["error_rate"] <= MAX_ERROR_RATE]
+    if within:
+        print(f"Highest level within p90 <= {args.slo_ms:.0f} ms and <= {MAX_ERROR_RATE:.0%} errors: {max(within)} users")
+    else:
+        print(f"No level met p90 <= {args.slo_ms:.0f} ms with <= {MAX_ERROR_RATE:.0%} errors")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
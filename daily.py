@@ -0,0 +1,257 @@
+import datetime
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Tuple
+
+from db import get_questions_by_date, get_set_version, publish_questions, format_db_row, acquire_lease, renew_lease, release_lease
+from pool import take_prefetched_set
+from selection import pick_bank_questions
+from snapshot import load_snapshot, write_snapshot
+from dedup import index_questions
+from metrics import inc
+
+# -------------------------
+# Cross-replica generation lease settings
+# -------------------------
+LEASE_TTL_SECONDS = 30       # A crashed holder blocks others for at most this long
+LEASE_HEARTBEAT_SECONDS = 10 # Holder renews the lease this often while generating
+LEASE_POLL_SECONDS = 1.0     # How often waiting replicas check for the published set
+LEASE_WAIT_SECONDS = 240     # Give up waiting on another replica after this long
+
+# Identifies this process in the generation_leases table
+REPLICA_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# -------------------------
+# Process-wide daily quiz cache
+# -------------------------
+# Keyed by date; entries for past days are dropped on the next store, so the cache rolls over at midnight.
+# The cached lists are shared by every session, so callers must treat them as read-only.
+# Each entry is (questions, monotonic time it was last checked against the DB).
+_cache: Dict[str, tuple] = {}
+_cache_lock = threading.Lock()
+CACHE_VERIFY_SECONDS = 5.0   # How long another replica's regenerate can go unnoticed here
+
+# Single-flight locks: at most one load/generation per date runs in this process
+_flight_locks: Dict[str, threading.Lock] = {}
+_flight_locks_guard = threading.Lock()
+
+def _flight_lock(date: str) -> threading.Lock:
+    with _flight_locks_guard:
+        lock = _flight_locks.get(date)
+        if lock is None:
+            # Drop locks of past days so the dict doesn't grow forever
+            today = datetime.date.today().isoformat()
+            for old_date in [d for d in _flight_locks if d < today and not _flight_locks[d].locked()]:
+                del _flight_locks[old_date]
+            lock = _flight_locks[date] = threading.Lock()
+        return lock
+
+def _version(questions: List[Dict[str, Any]]) -> int:
+    return max((q["id"] for q in questions), default=0)
+
+def _current_version(date: str) -> int | None:
+    """The DB's version of date's set, or None if there is no DB to ask (snapshot-only replica)."""
+    try:
+        return get_set_version(date)
+    except sqlite3.Error:
+        return None
+
+def _is_current(date: str, questions: List[Dict[str, Any]]) -> bool:
+    version = _current_version(date)
+    return version is None or version == _version(questions)
+
+def get_cached_questions(date: str) -> List[Dict[str, Any]] | None:
+    """Returns the in-memory set for date, or None on a miss.
+
+    Every CACHE_VERIFY_SECONDS the entry is checked against the DB (one indexed
+    MAX(id)), so a set regenerated by another replica replaces it here too.
+    """
+    with _cache_lock:
+        entry = _cache.get(date)
+    questions = entry[0] if entry else None
+    if entry and time.monotonic() - entry[1] >= CACHE_VERIFY_SECONDS:
+        current = _is_current(date, questions)
+        with _cache_lock:
+            if _cache.get(date) is entry:
+                if current:
+                    _cache[date] = (questions, time.monotonic())
+                else:
+                    print(f"Quiz for {date} was replaced by another replica; reloading.")
+                    del _cache[date]
+        if not current:
+            questions = None
+    inc("cache_lookups_total", cache="daily", result="miss" if questions is None else "hit")
+    return questions
+
+def _store(date: str, questions: List[Dict[str, Any]]):
+    today = datetime.date.today().isoformat()
+    with _cache_lock:
+        for old_date in [d for d in _cache if d < today]:
+            del _cache[old_date]
+        if date >= today:
+            _cache[date] = (questions, time.monotonic())
+
+def _publish_snapshot(date: str, questions: List[Dict[str, Any]]):
+    # The snapshot is an optimization; the DB stays the source of truth if it can't be written
+    try:
+        write_snapshot(date, questions)
+    except OSError as e:
+        print(f"Could not write quiz snapshot for {date}: {e}")
+
+def _load_from_db(date: str) -> List[Dict[str, Any]]:
+    return [format_db_row(row) for row in get_questions_by_date(date)]
+
+# -------------------------
+# Question set source: curated bank, then prefetch pool, live API only when both come up empty
+# -------------------------
+def next_question_set(date: str, on_question: Callable[[Dict[str, Any]], None] | None = None,
+                      fallback: bool = True, refill: bool = True) -> List[Dict[str, Any]]:
+    """Returns a validated question set, preferring the local bank, then a prefetched set.
+
+    on_question is only called when the set is generated live (streamed).
+    With fallback=False a failed API call yields [] instead of the sample questions;
+    with refill=False taking a pooled set doesn't start the prefetch worker.
+    """
+    questions = pick_bank_questions(date)
+    if questions:
+        inc("question_set_source_total", source="bank")
+        return questions
+    from questions import get_questions, validate_questions_for_save, replace_near_duplicates # <-- Local import breaks the loop
+    questions = take_prefetched_set(refill=refill)
+    if questions:
+        # Pooled sets were checked when generated; questions served since then may repeat them
+        questions = replace_near_duplicates(questions)
+        if questions:
+            inc("question_set_source_total", source="pool")
+            return questions
+    inc("question_set_source_total", source="live")
+    return validate_questions_for_save(get_questions(fallback=fallback, on_question=on_question))
+
+# -------------------------
+# Cross-replica lease: exactly one replica generates a day's set
+# -------------------------
+@contextmanager
+def _lease_heartbeat(lease_name: str):
+    """Renews the lease in the background until the block exits."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(LEASE_HEARTBEAT_SECONDS):
+            if not renew_lease(lease_name, REPLICA_ID, LEASE_TTL_SECONDS):
+                print(f"Lost generation lease {lease_name}; another replica may take over.")
+                return
+
+    thread = threading.Thread(target=beat, name=f"lease-{lease_name}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def _generate_under_lease(date: str, replace: bool, on_question=None, fallback: bool = True,
+                          refill: bool = True) -> List[Dict[str, Any]]:
+    """Generates and publishes the set for date while holding its lease.
+
+    Replicas that don't get the lease poll the DB until the holder publishes
+    (or its lease expires and they can take over).
+    """
+    lease_name = f"questions:{date}"
+    deadline = time.monotonic() + LEASE_WAIT_SECONDS
+
+    while not acquire_lease(lease_name, REPLICA_ID, LEASE_TTL_SECONDS):
+        if time.monotonic() > deadline:
+            print(f"Timed out waiting for another replica to generate {date}.")
+            return []
+        time.sleep(LEASE_POLL_SECONDS)
+        if not replace:
+            questions = _load_from_db(date)
+            if questions:
+                _store(date, questions)
+                return questions
+
+    try:
+        with _lease_heartbeat(lease_name):
+            if not replace:
+                # The previous holder may have published just before releasing the lease
+                questions = _load_from_db(date)
+                if questions:
+                    _store(date, questions)
+                    return questions
+
+            questions = next_question_set(date, on_question, fallback=fallback, refill=refill)
+            if not questions:
+                return []
+            published = publish_questions(date, questions, replace=replace)
+    finally:
+        release_lease(lease_name, REPLICA_ID)
+
+    # Reload so every session sees the DB ids that user answers refer to
+    questions = _load_from_db(date)
+    if questions:
+        if published:
+            # Later generations are checked against this set
+            index_questions(questions)
+        _publish_snapshot(date, questions)
+    _store(date, questions)
+    return questions
+
+# -------------------------
+# Public API for app
+# -------------------------
+def get_daily_questions(date: str, on_question: Callable[[Dict[str, Any]], None] | None = None) -> List[Dict[str, Any]]:
+    """Returns the set for date from memory, its snapshot file, the DB, or a single generation shared by all replicas.
+
+    If this call ends up generating live, on_question receives each question as it streams in.
+    """
+    questions = get_cached_questions(date)
+    if questions is not None:
+        return questions
+
+    with _flight_lock(date):
+        # Another thread may have filled the cache while we waited for the lock
+        questions = get_cached_questions(date)
+        if questions is not None:
+            return questions
+
+        # Pre-parsed snapshot: no per-row json.loads. A replica's local snapshot can lag a
+        # regenerate published elsewhere, so it is only used if it matches the DB's version
+        questions = load_snapshot(date)
+        if questions and _is_current(date, questions):
+            inc("daily_set_source_total", source="snapshot")
+            _store(date, questions)
+            return questions
+
+        questions = _load_from_db(date)
+        if questions:
+            inc("daily_set_source_total", source="db")
+            _publish_snapshot(date, questions)
+            _store(date, questions)
+            return questions
+
+        inc("daily_set_source_total", source="generated")
+        return _generate_under_lease(date, replace=False, on_question=on_question)
+
+def regenerate_daily_questions(date: str) -> List[Dict[str, Any]]:
+    """Replaces the set for date with a fresh one; returns [] if none could be produced."""
+    with _flight_lock(date):
+        return _generate_under_lease(date, replace=True)
+
+def prepare_daily_questions(date: str) -> Tuple[List[Dict[str, Any]], str]:
+    """Publishes the set for date ahead of time (offline backfill) unless it already exists.
+
+    Returns (questions, status) with status "existing", "generated" or "failed".
+    Never publishes the sample questions: a failed day stays empty and can be retried.
+    Never starts the prefetch worker either, so every API call is the caller's own.
+    """
+    with _flight_lock(date):
+        questions = _load_from_db(date)
+        if questions:
+            return questions, "existing"
+        questions = _generate_under_lease(date, replace=False, fallback=False, refill=False)
+        return questions, "generated" if questions else "failed"
@@ -1,30 +1,160 @@
 import sqlite3
 from sqlite3 import Error
+import re
 import json
+import queue
+import threading
+import time
+import datetime
+from contextlib import contextmanager
 from typing import List, Dict, Any
+from metrics import inc, observe, instrument_functions
 
 DB_NAME = "2two.db"
 
+# -------------------------
+# Connection tuning
+# -------------------------
+POOL_SIZE = 8                 # Idle connections kept open per database file
+BUSY_TIMEOUT_SECONDS = 10     # How long a writer waits for the lock before "database is locked"
+CACHED_STATEMENTS = 128       # Prepared statements cached per connection
+CACHE_SIZE_KIB = 8192         # Page cache per connection (negative PRAGMA value = KiB)
+
+# Process-wide pools, keyed by database file so DB_NAME can be switched (e.g. in scripts)
+_pools: Dict[str, queue.LifoQueue] = {}
+_pools_lock = threading.Lock()
+
 # -------------------------
 # Create DB connection
 # -------------------------
 def get_connection():
-    """Establishes a connection to the SQLite database file."""
+    """Establishes a tuned connection to the SQLite database file."""
     try:
-        conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+        conn = sqlite3.connect(
+            DB_NAME,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS
+        )
+        # WAL lets readers proceed while an answer is being written
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across app crashes in WAL mode and skips an fsync per commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
         return conn
     except Error as e:
         print("Error connecting to DB:", e)
         return None
 
+def _get_pool() -> queue.LifoQueue:
+    with _pools_lock:
+        pool = _pools.get(DB_NAME)
+        if pool is None:
+            pool = _pools[DB_NAME] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return pool
+
+@contextmanager
+def pooled_connection():
+    """Borrows a persistent connection from the process-wide pool and returns it afterwards."""
+    pool = _get_pool()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = get_connection()
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            if conn.in_transaction:
+                # Never hand a half-finished transaction to the next borrower
+                conn.rollback()
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+def close_all_connections():
+    """Closes every idle pooled connection (e.g. before replacing the DB file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
 # -------------------------
-# Create tables
+# Write-lock accounting (how often writers queue behind each other)
 # -------------------------
-def create_tables():
-    """Creates the necessary tables if they do not already exist."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+LOCK_WAIT_THRESHOLD_SECONDS = 0.001   # An uncontended BEGIN IMMEDIATE takes microseconds
+
+_lock_stats = {"acquired": 0, "waited": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+_lock_stats_lock = threading.Lock()
+
+def _begin_write(cursor):
+    """BEGIN IMMEDIATE, recording how long the write lock took (busy_timeout waits happen inside)."""
+    start = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError:
+        with _lock_stats_lock:
+            _lock_stats["timeouts"] += 1
+        inc("db_lock_timeouts_total")
+        raise
+    waited = time.perf_counter() - start
+    observe("db_lock_wait_seconds", waited)
+    with _lock_stats_lock:
+        _lock_stats["acquired"] += 1
+        if waited >= LOCK_WAIT_THRESHOLD_SECONDS:
+            _lock_stats["waited"] += 1
+            _lock_stats["wait_seconds"] += waited
+            _lock_stats["max_wait_seconds"] = max(_lock_stats["max_wait_seconds"], waited)
+
+def get_lock_stats() -> Dict[str, float]:
+    """Write-lock acquisitions in this process, and how many had to wait (or gave up)."""
+    with _lock_stats_lock:
+        return dict(_lock_stats)
+
+def reset_lock_stats():
+    with _lock_stats_lock:
+        _lock_stats.update(acquired=0, waited=0, timeouts=0, wait_seconds=0.0, max_wait_seconds=0.0)
+
+# -------------------------
+# Schema migrations (keyed on PRAGMA user_version)
+# -------------------------
+def _add_column_if_missing(cursor, table: str, column: str, declaration: str):
+    """ALTER TABLE for databases created before the column existed."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def _rebuild_answer_stats(cursor):
+    """Recomputes every aggregate from user_answers (one-time backfill for older databases)."""
+    cursor.execute("DELETE FROM question_stats")
+    cursor.execute("DELETE FROM topic_stats")
+    cursor.execute("DELETE FROM daily_stats")
+    cursor.execute("""
+    INSERT INTO question_stats (question_id, attempts, correct, choice_a, choice_b, choice_c, choice_d)
+    SELECT question_id, COUNT(*), SUM(correct),
+           SUM(choice = 'A'), SUM(choice = 'B'), SUM(choice = 'C'), SUM(choice = 'D')
+    FROM user_answers GROUP BY question_id
+    """)
+    cursor.execute("""
+    INSERT INTO topic_stats (sub_category, attempts, correct)
+    SELECT COALESCE(q.sub_category, 'General'), COUNT(*), SUM(a.correct)
+    FROM user_answers a JOIN questions q ON q.id = a.question_id
+    GROUP BY COALESCE(q.sub_category, 'General')
+    """)
+    cursor.execute("""
+    INSERT INTO daily_stats (date, attempts, correct)
+    SELECT date(timestamp), COUNT(*), SUM(correct) FROM user_answers GROUP BY date(timestamp)
+    """)
+
+def _migration_1_base(cursor):
+    """Original schema: daily questions and user answers."""
     # Questions table: Redesigned structure with JSON options and categories
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS questions (
@@ -38,7 +168,7 @@ def create_tables():
         explanation TEXT
     )
     """)
-    
+
     # User answers table: Stores user's history and results
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS user_answers (
@@ -50,41 +180,332 @@ def create_tables():
         FOREIGN KEY(question_id) REFERENCES questions(id)
     )
     """)
-    
-    conn.commit()
-    conn.close()
+
+def _migration_2_pool_and_leases(cursor):
+    """Prefetch pool and cross-replica generation leases."""
+    # Prefetch pool: validated question sets generated ahead of time
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_pool (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        questions TEXT,       -- JSON list of validated question dicts
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Generation leases: lets exactly one replica generate a given day's set
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS generation_leases (
+        name TEXT PRIMARY KEY,     -- e.g. 'questions:2025-01-31'
+        owner TEXT NOT NULL,       -- replica id of the current holder
+        expires_at REAL NOT NULL   -- unix time; holders extend it with a heartbeat
+    )
+    """)
+
+def _migration_3_question_bank(cursor):
+    """Curated question bank, import checkpoints and served history."""
+    # Question bank: curated questions imported from CSV/XLSX files (same columns as questions)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_bank (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT,
+        sub_category TEXT,
+        question TEXT,
+        options TEXT,
+        correct_option TEXT,
+        explanation TEXT,     -- may be empty until generated by the LLM
+        source TEXT,          -- file the row was imported from
+        content_hash TEXT UNIQUE  -- dedupes the same question across files and re-imports
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bank_category ON question_bank(category, sub_category)")
+
+    # ready_seq numbers bank rows in the order they became servable (have an explanation),
+    # so the selection engine can refresh incrementally with "WHERE ready_seq > last seen"
+    _add_column_if_missing(cursor, "question_bank", "ready_seq", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bank_ready_seq ON question_bank(ready_seq)")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS bank_ready_on_insert AFTER INSERT ON question_bank
+    WHEN NEW.explanation <> '' AND NEW.ready_seq IS NULL
+    BEGIN
+        UPDATE question_bank SET ready_seq = (SELECT COALESCE(MAX(ready_seq), 0) + 1 FROM question_bank)
+        WHERE id = NEW.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS bank_ready_on_explain AFTER UPDATE OF explanation ON question_bank
+    WHEN NEW.explanation <> '' AND NEW.ready_seq IS NULL
+    BEGIN
+        UPDATE question_bank SET ready_seq = (SELECT COALESCE(MAX(ready_seq), 0) + 1 FROM question_bank)
+        WHERE id = NEW.id;
+    END
+    """)
+    # Rows imported with an explanation before ready_seq existed
+    cursor.execute("""
+    UPDATE question_bank SET ready_seq = id + (SELECT COALESCE(MAX(ready_seq), 0) FROM question_bank)
+    WHERE ready_seq IS NULL AND explanation <> ''
+    """)
+
+    # Failed explanation attempts, so the batch explainer can give up on hopeless rows
+    _add_column_if_missing(cursor, "question_bank", "explain_attempts", "INTEGER DEFAULT 0")
+
+    # Which bank questions were served on which day (for "not served in the last N days")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS bank_served (
+        date TEXT,
+        bank_id INTEGER,
+        PRIMARY KEY(date, bank_id)
+    )
+    """)
+
+    # Import checkpoints so an interrupted import resumes where it stopped
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY,
+        fingerprint TEXT,     -- size/mtime of the file; a changed file restarts from row 0
+        rows_done INTEGER,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _migration_4_answer_stats(cursor):
+    """Incrementally maintained answer aggregates."""
+    # Materialized answer aggregates, kept current by a trigger on user_answers
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_stats (
+        question_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        choice_a INTEGER NOT NULL DEFAULT 0,  -- how often each option was picked
+        choice_b INTEGER NOT NULL DEFAULT 0,
+        choice_c INTEGER NOT NULL DEFAULT 0,
+        choice_d INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS topic_stats (
+        sub_category TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        date TEXT PRIMARY KEY,  -- UTC day the answers were given
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS user_answers_stats AFTER INSERT ON user_answers
+    BEGIN
+        INSERT INTO question_stats (question_id, attempts, correct, choice_a, choice_b, choice_c, choice_d)
+        VALUES (NEW.question_id, 1, NEW.correct,
+                NEW.choice = 'A', NEW.choice = 'B', NEW.choice = 'C', NEW.choice = 'D')
+        ON CONFLICT(question_id) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct,
+            choice_a = choice_a + excluded.choice_a,
+            choice_b = choice_b + excluded.choice_b,
+            choice_c = choice_c + excluded.choice_c,
+            choice_d = choice_d + excluded.choice_d;
+
+        INSERT INTO topic_stats (sub_category, attempts, correct)
+        SELECT COALESCE(sub_category, 'General'), 1, NEW.correct FROM questions WHERE id = NEW.question_id
+        ON CONFLICT(sub_category) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct;
+
+        INSERT INTO daily_stats (date, attempts, correct)
+        VALUES (date(NEW.timestamp), 1, NEW.correct)
+        ON CONFLICT(date) DO UPDATE SET
+            attempts = attempts + 1,
+            correct = correct + excluded.correct;
+    END
+    """)
+    # Backfill from answers recorded before the aggregates existed
+    _rebuild_answer_stats(cursor)
+
+def _migration_5_user_history(cursor):
+    """Anonymous user ids on answers."""
+    # Per-user history: anonymous user id + indexes for keyset pagination and per-question lookups
+    _add_column_if_missing(cursor, "user_answers", "user_id", "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_answers_user_time ON user_answers(user_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_answers_question ON user_answers(question_id)")
+
+def _migration_6_lookup_indexes(cursor):
+    """Index for the per-date lookup every page load does."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_date ON questions(date)")
+
+def _migration_7_dedup_index(cursor):
+    """MinHash signatures and LSH buckets for near-duplicate question checks."""
+    # Entries are never deleted, so a regenerated (retired) question still counts as seen
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_signatures (
+        id INTEGER PRIMARY KEY,
+        question_id INTEGER NOT NULL,
+        signature BLOB NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_signatures_question ON question_signatures(question_id)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS question_lsh (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        signature_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, signature_id)
+    ) WITHOUT ROWID
+    """)
+
+def _create_fts_index(cursor, table: str):
+    """External-content FTS5 index over table's text columns, kept in sync by triggers."""
+    fts = f"{table}_fts"
+    columns = "question, explanation, sub_category"
+    cursor.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        {columns}, content='{table}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.id, NEW.question, NEW.explanation, NEW.sub_category);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', OLD.id, OLD.question, OLD.explanation, OLD.sub_category);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', OLD.id, OLD.question, OLD.explanation, OLD.sub_category);
+        INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.id, NEW.question, NEW.explanation, NEW.sub_category);
+    END
+    """)
+    # ORDER BY rank = bm25 with the question text weighing most, then the topic
+    cursor.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25(10.0, 2.0, 5.0)')")
+    # Index the rows that existed before the triggers
+    cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+def _migration_8_practice_search(cursor):
+    """Full-text search and topic browsing for practice mode."""
+    _create_fts_index(cursor, "question_bank")
+    _create_fts_index(cursor, "questions")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bank_topic ON question_bank(sub_category, ready_seq)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions(sub_category, id)")
+
+def _migration_9_unservable_explanations(cursor):
+    """Clears placeholder or overlong imported explanations so explainer.py replaces them."""
+    # 40..130 words: questions.EXPLANATION_MIN_WORDS / EXPLANATION_MAX_WORDS when this was written
+    rows = cursor.execute("SELECT id, explanation FROM question_bank WHERE explanation <> ''").fetchall()
+    cursor.executemany(
+        "UPDATE question_bank SET explanation='', ready_seq=NULL WHERE id=?",
+        [(bank_id,) for bank_id, explanation in rows if not 40 <= len(explanation.split()) <= 130]
+    )
+
+# Append-only: PRAGMA user_version records how many of these a database has applied.
+# Every step is idempotent so databases built by the old create_tables() upgrade cleanly.
+MIGRATIONS = [
+    _migration_1_base,
+    _migration_2_pool_and_leases,
+    _migration_3_question_bank,
+    _migration_4_answer_stats,
+    _migration_5_user_history,
+    _migration_6_lookup_indexes,
+    _migration_7_dedup_index,
+    _migration_8_practice_search,
+    _migration_9_unservable_explanations,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Databases already migrated by this process (Streamlit reruns must not repeat the DDL)
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+def migrate():
+    """Brings the database up to SCHEMA_VERSION; a no-op after the first call in a process."""
+    if DB_NAME in _migrated:
+        return
+    with _migrate_lock:
+        if DB_NAME in _migrated:
+            return
+        with pooled_connection() as conn, conn:
+            cursor = conn.cursor()
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                # Write lock first, then re-read: another process may have just migrated
+                _begin_write(cursor)
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+                    print(f"Applying DB migration {number}: {step.__name__}")
+                    step(cursor)
+                    cursor.execute(f"PRAGMA user_version = {number}")
+        _migrated.add(DB_NAME)
+
+def create_tables():
+    """Kept for existing callers: runs the pending migrations."""
+    migrate()
 
 # -------------------------
 # Save questions
 # -------------------------
-def save_questions(date: str, questions: List[Dict[str, Any]], overwrite: bool = False):
-    """Saves a list of questions to the database."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def _retire_questions(cursor, date: str):
+    """Detaches a date's set without orphaning answers that point at it."""
+    # Never DELETE: answers still buffered in some replica's writer (not yet in user_answers)
+    # may refer to any of these ids, so every retired question stays with date=NULL
+    cursor.execute("UPDATE questions SET date=NULL WHERE date=?", (date,))
 
-    if overwrite:
-        # Delete old questions for the current date to ensure fresh content
-        cursor.execute("DELETE FROM questions WHERE date=?", (date,))
-    
-    for q in questions:
-        # Serialize the options dictionary into a JSON string before saving
-        options_json = json.dumps(q["options"])
-        
-        cursor.execute("""
-        INSERT INTO questions 
-        (date, category, sub_category, question, options, correct_option, explanation)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+def _insert_questions(cursor, date: str, questions: List[Dict[str, Any]]):
+    # One prepared INSERT executed for every question in the same transaction
+    cursor.executemany("""
+    INSERT INTO questions
+    (date, category, sub_category, question, options, correct_option, explanation)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
             date,
             q["type"],             # Mapped from 'type' in LLM output
             q["sub_category"],
             q["question"],
-            options_json,
+            json.dumps(q["options"]),  # Serialize the options dictionary into a JSON string
             q["answer"],           # Mapped from 'answer' in LLM output
             q["explanation"]
-        ))
-    conn.commit()
-    conn.close()
+        )
+        for q in questions
+    ])
+
+def publish_questions(date: str, questions: List[Dict[str, Any]], replace: bool = False) -> bool:
+    """Atomically swaps in the set for date.
+
+    With replace=False nothing is written if a set already exists (another replica
+    published first) and False is returned. Readers see either the old or the new set.
+    """
+    with pooled_connection() as conn, conn:
+        cursor = conn.cursor()
+        # Take the write lock up front so the existence check and the insert can't interleave
+        _begin_write(cursor)
+
+        if replace:
+            _retire_questions(cursor, date)
+        elif cursor.execute("SELECT 1 FROM questions WHERE date=? LIMIT 1", (date,)).fetchone():
+            return False
+
+        _insert_questions(cursor, date, questions)
+        # Bank-sourced questions are recorded as served in the same transaction
+        cursor.executemany(
+            "INSERT OR IGNORE INTO bank_served (date, bank_id) VALUES (?, ?)",
+            [(date, q["bank_id"]) for q in questions if q.get("bank_id")]
+        )
+        return True
+
+def save_questions(date: str, questions: List[Dict[str, Any]], overwrite: bool = False):
+    """Saves a list of questions to the database."""
+    if overwrite:
+        publish_questions(date, questions, replace=True)
+        return
+
+    with pooled_connection() as conn, conn:
+        _insert_questions(conn.cursor(), date, questions)
 
 
 # -------------------------
@@ -92,24 +513,396 @@ def save_questions(date: str, questions: List[Dict[str, Any]], overwrite: bool =
 # -------------------------
 def get_questions_by_date(date: str) -> List[tuple]:
     """Fetches all question data for a specific date."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    # Select all columns in the new schema order
-    cursor.execute("SELECT id, category, sub_category, question, options, correct_option, explanation FROM questions WHERE date=?", (date,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        # Select all columns in the new schema order
+        cursor.execute("SELECT id, category, sub_category, question, options, correct_option, explanation FROM questions WHERE date=?", (date,))
+        return cursor.fetchall()
+
+# -------------------------
+# Utility function to convert DB row to app dictionary format
+# -------------------------
+def get_set_version(date: str) -> int | None:
+    """Highest question id published for date (changes whenever the set is replaced), or None."""
+    with pooled_connection() as conn:
+        return conn.execute("SELECT MAX(id) FROM questions WHERE date=?", (date,)).fetchone()[0]
+
+def format_db_row(row) -> Dict[str, Any]:
+    """Converts a SQLite row tuple into the app's dictionary format."""
+    # Columns: id, category, sub_category, question, options (JSON), correct_option, explanation
+    return {
+        "id": row[0],
+        "type": row[1],
+        "sub_category": row[2],
+        "question": row[3],
+        "options": json.loads(row[4]),  # Deserialize the JSON string back to a dict
+        "answer": row[5],              # Mapped from correct_option
+        "explanation": row[6]
+    }
 
 # -------------------------
 # Save user answer
 # -------------------------
-def save_user_answer(question_id: int, choice: str, correct: bool):
+def save_user_answers(answers: List[tuple]):
+    """Saves a batch of (question_id, choice, correct, timestamp, user_id) rows in one transaction."""
+    with pooled_connection() as conn, conn:
+        _begin_write(conn.cursor())
+        conn.executemany("""
+        INSERT INTO user_answers (question_id, choice, correct, timestamp, user_id)
+        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        """, [(qid, choice, int(correct), ts, user_id) for qid, choice, correct, ts, user_id in answers])
+
+def save_user_answer(question_id: int, choice: str, correct: bool, user_id: str | None = None):
     """Saves the user's choice and correctness status for a question."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    INSERT INTO user_answers (question_id, choice, correct)
-    VALUES (?, ?, ?)
-    """, (question_id, choice, int(correct)))
-    conn.commit()
-    conn.close()
+    save_user_answers([(question_id, choice, correct, None, user_id)])
+
+# -------------------------
+# Answer history (keyset pagination on (timestamp, id))
+# -------------------------
+def get_user_history(user_id: str, before: tuple | None = None, limit: int = 20) -> tuple:
+    """Returns (rows, next_cursor) for one page of a user's answers, newest first.
+
+    before is the cursor returned by the previous page; next_cursor is None on the last page.
+    Only the requested page is read, via the (user_id, timestamp) index.
+    """
+    timestamp, answer_id = before if before else ("9999-12-31 23:59:59", 2 ** 63 - 1)
+    with pooled_connection() as conn:
+        rows = conn.execute("""
+        SELECT a.id, a.timestamp, a.choice, a.correct, q.question, q.sub_category, q.correct_option
+        FROM user_answers a LEFT JOIN questions q ON q.id = a.question_id
+        WHERE a.user_id = ? AND (a.timestamp, a.id) < (?, ?)
+        ORDER BY a.timestamp DESC, a.id DESC
+        LIMIT ?
+        """, (user_id, timestamp, answer_id, limit + 1)).fetchall()
+    history = [
+        {
+            "id": r[0], "timestamp": r[1], "choice": r[2], "correct": bool(r[3]),
+            "question": r[4], "sub_category": r[5], "answer": r[6]
+        }
+        for r in rows[:limit]
+    ]
+    next_cursor = (history[-1]["timestamp"], history[-1]["id"]) if len(rows) > limit else None
+    return history, next_cursor
+
+def get_question_summaries(question_ids: List[int]) -> Dict[int, tuple]:
+    """question_id -> (question, sub_category, correct_option), for answers not yet in user_answers."""
+    if not question_ids:
+        return {}
+    with pooled_connection() as conn:
+        rows = conn.execute(f"""
+        SELECT id, question, sub_category, correct_option FROM questions
+        WHERE id IN ({",".join("?" * len(question_ids))})
+        """, list(question_ids)).fetchall()
+    return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+# -------------------------
+# Prefetch pool
+# -------------------------
+def push_pool_set(questions: List[Dict[str, Any]]):
+    """Stores one validated question set in the prefetch pool."""
+    with pooled_connection() as conn, conn:
+        conn.execute("INSERT INTO question_pool (questions) VALUES (?)", (json.dumps(questions),))
+
+def pop_pool_set() -> List[Dict[str, Any]] | None:
+    """Removes and returns the oldest pooled question set, or None if the pool is empty."""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("SELECT id, questions FROM question_pool ORDER BY id LIMIT 1")
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            # Another session may claim the same row; only the one whose DELETE lands owns it
+            with conn:
+                cursor.execute("DELETE FROM question_pool WHERE id=?", (row[0],))
+                claimed = cursor.rowcount == 1
+            if claimed:
+                return json.loads(row[1])
+
+def count_pool_sets() -> int:
+    """Returns the number of question sets waiting in the prefetch pool."""
+    with pooled_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM question_pool").fetchone()[0]
+
+# -------------------------
+# Generation leases (cross-replica lock with expiry)
+# -------------------------
+def acquire_lease(name: str, owner: str, ttl_seconds: float) -> bool:
+    """Takes the lease if it is free, expired, or already ours. Returns True on success."""
+    now = time.time()
+    with pooled_connection() as conn, conn:
+        cursor = conn.execute("""
+        INSERT INTO generation_leases (name, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+        WHERE generation_leases.expires_at < ? OR generation_leases.owner = excluded.owner
+        """, (name, owner, now + ttl_seconds, now))
+        return cursor.rowcount == 1
+
+def renew_lease(name: str, owner: str, ttl_seconds: float) -> bool:
+    """Heartbeat: extends a lease we still hold. Returns False if it was lost."""
+    with pooled_connection() as conn, conn:
+        cursor = conn.execute(
+            "UPDATE generation_leases SET expires_at=? WHERE name=? AND owner=?",
+            (time.time() + ttl_seconds, name, owner)
+        )
+        return cursor.rowcount == 1
+
+def release_lease(name: str, owner: str):
+    """Drops a lease we hold so waiting replicas don't have to wait for expiry."""
+    with pooled_connection() as conn, conn:
+        conn.execute("DELETE FROM generation_leases WHERE name=? AND owner=?", (name, owner))
+
+# -------------------------
+# Question bank import
+# -------------------------
+def get_import_progress(source: str) -> tuple | None:
+    """Returns (fingerprint, rows_done) of the last import of source, if any."""
+    with pooled_connection() as conn:
+        return conn.execute(
+            "SELECT fingerprint, rows_done FROM import_progress WHERE source=?", (source,)
+        ).fetchone()
+
+def insert_bank_batch(source: str, fingerprint: str, rows_done: int, rows: List[tuple]) -> int:
+    """Inserts one batch of bank rows and advances the checkpoint in the same transaction.
+
+    rows are (category, sub_category, question, options_json, correct_option, explanation, content_hash).
+    Returns the number of new rows; duplicates (same content_hash) are skipped.
+    """
+    with pooled_connection() as conn, conn:
+        _begin_write(conn.cursor())
+        cursor = conn.executemany("""
+        INSERT OR IGNORE INTO question_bank
+        (category, sub_category, question, options, correct_option, explanation, content_hash, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [row + (source,) for row in rows])
+        # rowcount excludes rows touched by triggers, unlike total_changes
+        inserted = max(cursor.rowcount, 0)
+        conn.execute("""
+        INSERT INTO import_progress (source, fingerprint, rows_done, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source) DO UPDATE SET
+            fingerprint=excluded.fingerprint, rows_done=excluded.rows_done, updated_at=excluded.updated_at
+        """, (source, fingerprint, rows_done))
+        return inserted
+
+# -------------------------
+# Question bank selection
+# -------------------------
+def get_ready_bank_ids(after_seq: int) -> List[tuple]:
+    """Returns (ready_seq, id, category, sub_category) of bank rows that became servable after after_seq."""
+    with pooled_connection() as conn:
+        return conn.execute("""
+        SELECT ready_seq, id, category, sub_category FROM question_bank
+        WHERE ready_seq > ? ORDER BY ready_seq
+        """, (after_seq,)).fetchall()
+
+def get_served_bank_ids(start_date: str, end_date: str) -> set:
+    """Bank ids served on any day in [start_date, end_date]."""
+    with pooled_connection() as conn:
+        rows = conn.execute(
+            "SELECT bank_id FROM bank_served WHERE date BETWEEN ? AND ?", (start_date, end_date)
+        ).fetchall()
+    return {row[0] for row in rows}
+
+def get_bank_questions(ids: List[int]) -> List[Dict[str, Any]]:
+    """Loads bank rows in the app's dictionary format (in the order of ids), tagged with bank_id."""
+    if not ids:
+        return []
+    with pooled_connection() as conn:
+        rows = conn.execute(f"""
+        SELECT id, category, sub_category, question, options, correct_option, explanation
+        FROM question_bank WHERE id IN ({",".join("?" * len(ids))})
+        """, ids).fetchall()
+    by_id = {row[0]: dict(format_db_row(row), bank_id=row[0]) for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+# -------------------------
+# Question bank explanations
+# -------------------------
+def get_unexplained_bank_rows(after_id: int, limit: int, max_attempts: int) -> List[tuple]:
+    """Next page (keyset on id) of bank rows still missing an explanation."""
+    with pooled_connection() as conn:
+        return conn.execute("""
+        SELECT id, category, sub_category, question, options, correct_option FROM question_bank
+        WHERE id > ? AND (explanation IS NULL OR explanation = '') AND explain_attempts < ?
+        ORDER BY id LIMIT ?
+        """, (after_id, max_attempts, limit)).fetchall()
+
+def save_bank_explanations(explanations: List[tuple]):
+    """Writes a batch of (explanation, bank_id) in one transaction."""
+    with pooled_connection() as conn, conn:
+        # The empty-check keeps a concurrent run from overwriting an explanation already written
+        conn.executemany("""
+        UPDATE question_bank SET explanation=?
+        WHERE id=? AND (explanation IS NULL OR explanation = '')
+        """, explanations)
+
+def mark_explanations_failed(bank_ids: List[int]):
+    """Counts one more failed attempt for each id."""
+    with pooled_connection() as conn, conn:
+        conn.executemany(
+            "UPDATE question_bank SET explain_attempts = explain_attempts + 1 WHERE id=?",
+            [(bank_id,) for bank_id in bank_ids]
+        )
+
+# -------------------------
+# Near-duplicate index (signatures are computed in dedup.py)
+# -------------------------
+def save_question_signatures(entries: List[tuple]):
+    """Indexes a batch of (question_id, signature_blob, [(band, bucket), ...]) in one transaction."""
+    with pooled_connection() as conn, conn:
+        cursor = conn.cursor()
+        _begin_write(cursor)
+        for question_id, signature, band_keys in entries:
+            cursor.execute(
+                "INSERT INTO question_signatures (question_id, signature) VALUES (?, ?)",
+                (question_id, signature)
+            )
+            signature_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT OR IGNORE INTO question_lsh (band, bucket, signature_id) VALUES (?, ?, ?)",
+                [(band, bucket, signature_id) for band, bucket in band_keys]
+            )
+
+def get_signature_candidates(band_keys: List[tuple]) -> List[tuple]:
+    """(question_id, signature_blob) of every indexed question sharing at least one LSH bucket."""
+    candidates = {}
+    with pooled_connection() as conn:
+        # One primary-key range probe per band
+        for band, bucket in band_keys:
+            for signature_id, question_id, signature in conn.execute("""
+            SELECT s.id, s.question_id, s.signature FROM question_lsh l
+            JOIN question_signatures s ON s.id = l.signature_id
+            WHERE l.band=? AND l.bucket=?
+            """, (band, bucket)):
+                candidates[signature_id] = (question_id, signature)
+    return list(candidates.values())
+
+def get_unindexed_questions(after_id: int, limit: int) -> List[tuple]:
+    """Next page (keyset on id) of (id, question) rows that have no signature yet."""
+    with pooled_connection() as conn:
+        return conn.execute("""
+        SELECT id, question FROM questions
+        WHERE id > ? AND id NOT IN (SELECT question_id FROM question_signatures)
+        ORDER BY id LIMIT ?
+        """, (after_id, limit)).fetchall()
+
+# -------------------------
+# Practice mode search (FTS5)
+# -------------------------
+# Practice sources: the curated bank (explained rows only) and the quiz questions of past days.
+# Each entry is (table, servable-row condition, browse order). The condition takes today's date
+# as its one parameter: nothing picked for today or a (backfilled) future day may be revealed.
+PRACTICE_SOURCES = {
+    "bank": (
+        "question_bank",
+        "t.ready_seq IS NOT NULL AND t.id NOT IN (SELECT bank_id FROM bank_served WHERE date >= ?)",
+        "t.ready_seq",
+    ),
+    # Retired (regenerated) questions have date=NULL and were never served
+    "archive": ("questions", "(t.date < ? OR t.date IS NULL)", "t.id"),
+}
+
+def _fts_query(text: str, sub_category: str | None = None) -> str:
+    """Turns free text into an FTS5 query (no syntax errors possible).
+
+    Every word must match; the last one as a prefix so results follow the typing.
+    The topic becomes a phrase filter, so FTS5 narrows the matches before the join.
+    """
+    terms = [f'"{word}"' for word in re.findall(r"\w+", text)]
+    if not terms:
+        return ""
+    terms[-1] += "*"
+    if sub_category:
+        terms.append('sub_category : "' + sub_category.replace('"', '""') + '"')
+    return " ".join(terms)
+
+def search_questions(query: str = "", sub_category: str | None = None, source: str = "bank",
+                     limit: int = 20, offset: int = 0) -> tuple:
+    """Returns (questions, has_more) for one page of practice results.
+
+    With a query, every servable match is ranked by bm25 (best first); without
+    one, the topic is browsed in the order questions became available.
+    """
+    table, servable, browse_order = PRACTICE_SOURCES[source]
+    match = _fts_query(query, sub_category)
+    today = datetime.date.today().isoformat()
+    params: List[Any] = []
+    if match:
+        # No candidate cap before ranking: a capped subquery keeps the first matches in
+        # rowid order (unservable ones included), not the best-ranked ones
+        sql = f"""
+        SELECT t.id, t.category, t.sub_category, t.question, t.options, t.correct_option, t.explanation
+        FROM {table}_fts f JOIN {table} t ON t.id = f.rowid
+        WHERE {table}_fts MATCH ? AND {servable}
+        """
+        params.extend([match, today])
+    else:
+        sql = f"""
+        SELECT t.id, t.category, t.sub_category, t.question, t.options, t.correct_option, t.explanation
+        FROM {table} t WHERE {servable}
+        """
+        params.append(today)
+    if sub_category:
+        # The FTS phrase filter is token-based; this keeps the topic match exact
+        sql += " AND t.sub_category = ?"
+        params.append(sub_category)
+    sql += " ORDER BY f.rank, t.id" if match else f" ORDER BY {browse_order}"
+    sql += " LIMIT ? OFFSET ?"
+    # One extra row tells the page whether there is a next page
+    params.extend([limit + 1, offset])
+
+    with pooled_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [format_db_row(row) for row in rows[:limit]], len(rows) > limit
+
+def get_practice_topics(source: str = "bank") -> List[tuple]:
+    """(sub_category, question count) for the practice topic picker."""
+    table, servable, _ = PRACTICE_SOURCES[source]
+    with pooled_connection() as conn:
+        return conn.execute(f"""
+        SELECT t.sub_category, COUNT(*) FROM {table} t
+        WHERE {servable} AND t.sub_category IS NOT NULL
+        GROUP BY t.sub_category ORDER BY t.sub_category
+        """, (datetime.date.today().isoformat(),)).fetchall()
+
+# -------------------------
+# Answer statistics (O(1) reads from the aggregate tables)
+# -------------------------
+def get_question_stats(question_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Per-question attempts, correct count and option distribution, keyed by question id."""
+    if not question_ids:
+        return {}
+    with pooled_connection() as conn:
+        rows = conn.execute(f"""
+        SELECT question_id, attempts, correct, choice_a, choice_b, choice_c, choice_d
+        FROM question_stats WHERE question_id IN ({",".join("?" * len(question_ids))})
+        """, list(question_ids)).fetchall()
+    return {
+        row[0]: {
+            "attempts": row[1],
+            "correct": row[2],
+            "choices": {"A": row[3], "B": row[4], "C": row[5], "D": row[6]},
+        }
+        for row in rows
+    }
+
+def get_topic_stats() -> List[Dict[str, Any]]:
+    """Accuracy per sub_category, hardest topics first."""
+    with pooled_connection() as conn:
+        rows = conn.execute("""
+        SELECT sub_category, attempts, correct FROM topic_stats
+        WHERE attempts > 0 ORDER BY CAST(correct AS REAL) / attempts, sub_category
+        """).fetchall()
+    return [{"sub_category": r[0], "attempts": r[1], "correct": r[2]} for r in rows]
+
+def get_daily_stats(date: str) -> Dict[str, Any]:
+    """Attempts and correct answers given on date (UTC)."""
+    with pooled_connection() as conn:
+        row = conn.execute("SELECT attempts, correct FROM daily_stats WHERE date=?", (date,)).fetchone()
+    return {"date": date, "attempts": row[0] if row else 0, "correct": row[1] if row else 0}
+
+# -------------------------
+# Instrumentation: time every public function above (a no-op unless QUIZ_METRICS is set)
+# -------------------------
+instrument_functions(globals(), "db", skip={"pooled_connection"})
@@ -1,23 +1,82 @@
+"""Read-only inspection of the 2^two database.
+
+Usage:
+    python dbtest.py                    # schema status, table sizes and today's questions
+    python dbtest.py --date 2025-01-31 --db path/to/2two.db
+"""
+import sys
 import sqlite3
+import argparse
 import datetime
 
-DB_NAME = "twotwo.db"
-today = datetime.date.today().isoformat()
+import db
+
+# -------------------------
+# Inspection helpers
+# -------------------------
+def connect_read_only(path: str) -> sqlite3.Connection:
+    """Opens the file without creating it or taking write locks."""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
 
-conn = sqlite3.connect(DB_NAME)
-cursor = conn.cursor()
+def print_schema_status(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    print(f"Schema version: {version} (code expects {db.SCHEMA_VERSION}), journal mode: {journal}")
+    for number, step in enumerate(db.MIGRATIONS[version:], start=version + 1):
+        print(f"  pending migration {number}: {step.__name__}")
 
-cursor.execute("SELECT id, question, option_a, option_b, option_c, option_d, answer FROM questions WHERE date=?", (today,))
-rows = cursor.fetchall()
+def print_tables(conn):
+    print("Tables:")
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    for table in tables:
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        columns = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        print(f"  {table:<20} {count:>10} rows  ({', '.join(columns)})")
+    indexes = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    print(f"Indexes: {', '.join(indexes) or '(none)'}")
 
-if not rows:
-    print("No questions found for today.")
-else:
-    for r in rows:
-        print(f"ID: {r[0]}")
-        print(f"Q: {r[1]}")
-        print(f"A: {r[2]}, B: {r[3]}, C: {r[4]}, D: {r[5]}")
-        print(f"Answer: {r[6]}")
+def print_questions(conn, date: str):
+    rows = conn.execute(
+        "SELECT id, category, sub_category, question, options, correct_option, explanation FROM questions WHERE date=?",
+        (date,)
+    ).fetchall()
+    if not rows:
+        print(f"No questions found for {date}.")
+        return
+    print(f"Questions for {date}:")
+    for row in rows:
+        q = db.format_db_row(row)
         print("-" * 40)
+        print(f"ID: {q['id']}  [{q['type']} / {q['sub_category']}]")
+        print(f"Q: {q['question']}")
+        print("   " + " | ".join(f"{key}: {val}" for key, val in q["options"].items()))
+        print(f"Answer: {q['answer']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the 2^two SQLite database (read-only).")
+    parser.add_argument("--db", default=db.DB_NAME, help="database file")
+    parser.add_argument("--date", default=datetime.date.today().isoformat(), help="quiz date to show")
+    args = parser.parse_args(argv)
+
+    try:
+        conn = connect_read_only(args.db)
+    except sqlite3.Error as e:
+        print(f"Cannot open {args.db}: {e}")
+        return 1
+    try:
+        print_schema_status(conn)
+        print_tables(conn)
+        print_questions(conn, args.date)
+    except sqlite3.Error as e:
+        print(f"Cannot inspect {args.db}: {e}")
+        return 1
+    finally:
+        conn.close()
+    return 0
 
-conn.close()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import re
+import random
+import hashlib
+import threading
+from array import array
+from typing import List, Dict, Any, Iterable
+
+from db import save_question_signatures, get_signature_candidates, get_unindexed_questions
+
+# -------------------------
+# MinHash / LSH settings
+# -------------------------
+NUM_PERM = 64                  # MinHash values per question
+BANDS = 16                     # LSH bands; two questions are compared if any band matches exactly
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 2              # Word n-grams; questions are short, so bigrams keep enough overlap
+DUPLICATE_THRESHOLD = 0.8      # Estimated Jaccard similarity at which a question counts as a repeat;
+                               # templated questions that differ only in numbers or nouns score ~0.5-0.7
+BACKFILL_BATCH = 1000
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures stored in the DB must stay comparable across processes and restarts
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Existing questions are indexed once per process before the first check
+_backfilled = False
+_backfill_lock = threading.Lock()
+
+# -------------------------
+# Signatures
+# -------------------------
+def shingles(text: str) -> set:
+    """Normalized word n-grams (case, punctuation and spacing don't matter)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def signature(text: str) -> array:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in shingles(text)
+    ]
+    return array("I", (
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ))
+
+def band_keys(sig: array) -> List[tuple]:
+    """(band, bucket) pairs; the bucket is a signed 64-bit hash so it fits an SQLite INTEGER."""
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        bucket = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "little", signed=True)
+        keys.append((band, bucket))
+    return keys
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of the two questions' shingle sets."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+def _from_blob(blob: bytes) -> array:
+    sig = array("I")
+    sig.frombytes(blob)
+    return sig
+
+# -------------------------
+# Index maintenance
+# -------------------------
+def index_questions(questions: List[Dict[str, Any]]):
+    """Adds published questions (with their DB ids) to the index."""
+    entries = []
+    for q in questions:
+        sig = signature(q["question"])
+        entries.append((q["id"], sig.tobytes(), band_keys(sig)))
+    save_question_signatures(entries)
+
+def backfill_index():
+    """Indexes questions published before the index existed (once per process)."""
+    global _backfilled
+    if _backfilled:
+        return
+    with _backfill_lock:
+        if _backfilled:
+            return
+        last_id, indexed = 0, 0
+        while True:
+            rows = get_unindexed_questions(last_id, BACKFILL_BATCH)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            index_questions([{"id": row[0], "question": row[1]} for row in rows])
+            indexed += len(rows)
+        if indexed:
+            print(f"Dedup index: backfilled {indexed} questions.")
+        _backfilled = True
+
+# -------------------------
+# Novelty check
+# -------------------------
+def _repeats_any(sig: array, texts: Iterable[str]) -> bool:
+    return any(similarity(sig, signature(other)) >= DUPLICATE_THRESHOLD for other in texts)
+
+def repeats_any(text: str, texts: Iterable[str]) -> bool:
+    """True if text is a near-duplicate of one of texts (the DB is not consulted)."""
+    return _repeats_any(signature(text), texts)
+
+def find_near_duplicate(text: str, accepted: Iterable[str] = ()) -> int | None:
+    """Returns the id of an earlier question text is a near-duplicate of, else None.
+
+    accepted holds questions already picked for the set being built (not yet in
+    the DB); a repeat of one of those is reported as id 0.
+    """
+    backfill_index()
+    sig = signature(text)
+    if _repeats_any(sig, accepted):
+        return 0
+    best_id, best = None, DUPLICATE_THRESHOLD
+    for question_id, blob in get_signature_candidates(band_keys(sig)):
+        score = similarity(sig, _from_blob(blob))
+        if score >= best:
+            best_id, best = question_id, score
+    return best_id
@@ -0,0 +1,178 @@
+"""Offline batch generation of explanations for imported bank questions.
+
+Usage:
+    python explainer.py                       # explain every bank row still missing one
+    python explainer.py --workers 4 --rate 20 --limit 500
+
+Progress lives in the database (rows with an empty explanation are pending), so
+an interrupted run simply picks up where it stopped.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any
+
+from db import migrate, get_unexplained_bank_rows, save_bank_explanations, mark_explanations_failed
+
+# -------------------------
+# Pipeline settings
+# -------------------------
+WORKERS = 4                 # Concurrent OpenRouter requests
+RATE_PER_MINUTE = 20        # OpenRouter free-tier limit; the token bucket never exceeds it
+BURST = 4                   # Requests allowed back-to-back before the bucket throttles
+PAGE_SIZE = 100             # Rows read per keyset page (bounds in-flight work)
+WRITE_BATCH = 25            # Explanations written per transaction
+MAX_ATTEMPTS = 3            # Rows that failed this often are skipped by later runs
+
+EXPLANATION_PROMPT = """
+Write the explanation for this {category} multiple-choice question ({sub_category}).
+
+Question: {question}
+Options:
+{options}
+Correct answer: {answer}
+
+Explain why the correct answer is correct in **between 50 and 100 words**.
+Return only the explanation text, without headings, quotes or markdown.
+"""
+
+# -------------------------
+# Token-bucket rate limiter
+# -------------------------
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, up to capacity saved up."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until one token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# -------------------------
+# One explanation request
+# -------------------------
+def _parse_explanation(text: str) -> str | None:
+    from questions import QUESTION_VALIDATOR
+
+    explanation = " ".join(text.strip().strip('"').split())
+    words = len(explanation.split())
+    if not QUESTION_VALIDATOR.min_words <= words <= QUESTION_VALIDATOR.max_words:
+        return None
+    return explanation
+
+def explain_row(row: tuple, bucket: TokenBucket) -> str | None:
+    """Generates the explanation for one bank row; None if every attempt failed."""
+    from questions import get_api_key
+    from llm import chat_completion
+
+    api_key = get_api_key()
+    if not api_key:
+        print("InferenceClient not initialized. Check OPENROUTER_API_KEY.")
+        return None
+
+    bank_id, category, sub_category, question, options_json, answer = row
+    options = json.loads(options_json)
+    prompt = EXPLANATION_PROMPT.format(
+        category=category,
+        sub_category=sub_category,
+        question=question,
+        options="\n".join(f"{key}: {val}" for key, val in options.items()),
+        answer=f"{answer}: {options.get(answer, '')}",
+    )
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "http://localhost"
+    }
+    payload = {
+        "messages": [
+            {"role": "system", "content": "You are an expert CSE interview tutor writing concise explanations."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.4,
+        "max_tokens": 400
+    }
+
+    # The request engine retries with backoff and walks the fallback models; every attempt takes a token
+    result = chat_completion(headers, payload, parse=_parse_explanation, before_attempt=bucket.acquire)
+    return result[0] if result else None
+
+# -------------------------
+# Batch driver
+# -------------------------
+def run(workers: int = WORKERS, rate_per_minute: float = RATE_PER_MINUTE, limit: int | None = None) -> Dict[str, Any]:
+    """Explains pending bank rows until none are left (or limit rows were tried)."""
+    bucket = TokenBucket(rate_per_minute / 60.0, BURST)
+    report = {"explained": 0, "failed": 0, "seconds": 0.0}
+    start = time.monotonic()
+    last_id = 0
+    pending_writes: List[tuple] = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="explain") as executor:
+        while limit is None or report["explained"] + report["failed"] < limit:
+            page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - report["explained"] - report["failed"])
+            rows = get_unexplained_bank_rows(last_id, page_size, MAX_ATTEMPTS)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            futures = {executor.submit(explain_row, row, bucket): row[0] for row in rows}
+            failed = []
+            for future in as_completed(futures):
+                bank_id = futures[future]
+                try:
+                    explanation = future.result()
+                except Exception as e:
+                    print(f"Explanation for bank row {bank_id} crashed: {e}")
+                    explanation = None
+                if explanation:
+                    pending_writes.append((explanation, bank_id))
+                    report["explained"] += 1
+                else:
+                    failed.append(bank_id)
+                    report["failed"] += 1
+                if len(pending_writes) >= WRITE_BATCH:
+                    save_bank_explanations(pending_writes)
+                    pending_writes = []
+
+            if failed:
+                mark_explanations_failed(failed)
+            elapsed = time.monotonic() - start
+            print(f"Explained {report['explained']} ({report['failed']} failed), {report['explained'] / elapsed * 60:.1f}/min")
+
+    if pending_writes:
+        save_bank_explanations(pending_writes)
+    report["seconds"] = time.monotonic() - start
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate missing explanations for imported bank questions.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=RATE_PER_MINUTE, help="max requests per minute")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    args = parser.parse_args(argv)
+
+    migrate()
+    report = run(workers=args.workers, rate_per_minute=args.rate, limit=args.limit)
+    print(f"Done: {report['explained']} explained, {report['failed']} failed in {report['seconds']:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Bulk importer for the curated question banks (CSV or XLSX in the csvformat.xlsx layout).
+
+Usage:
+    python importer.py aptitude_textbook_questions.csv technical_pyq_questions.csv
+    python importer.py bank.xlsx --batch-size 10000 --restart
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+from itertools import islice
+from typing import Dict, Any, Iterator, List
+
+from db import migrate, get_import_progress, insert_bank_batch
+from questions import QuestionValidator, EXPLANATION_MIN_WORDS, EXPLANATION_MAX_WORDS
+
+# -------------------------
+# Import settings
+# -------------------------
+BATCH_SIZE = 5000          # Rows per transaction; memory use is bounded by one batch
+PROGRESS_EVERY = 50000     # Print a rows/sec line this often
+
+# csvformat.xlsx columns: sq, question, option_a..option_d, answer, explanation,
+# type ('Aptitude'/'Technical' -> category) and category (topic -> sub_category)
+OPTION_COLUMNS = {"A": "option_a", "B": "option_b", "C": "option_c", "D": "option_d"}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# -------------------------
+# Streaming readers
+# -------------------------
+def read_csv_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields one dict per CSV row without loading the file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+
+def read_xlsx_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields one dict per row of the first sheet, streaming via openpyxl's read-only mode."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Importing .xlsx files requires openpyxl (pip install openpyxl).")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(h).strip().lower() if h is not None else "" for h in next(rows, [])]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return read_xlsx_rows(path)
+    return read_csv_rows(path)
+
+# -------------------------
+# Row validation / normalization
+# -------------------------
+def _text(value) -> str:
+    if value is None:
+        return ""
+    # XLSX cells can be numbers (e.g. option "12"); keep integers free of a trailing ".0"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def content_hash(question: str, options: Dict[str, str]) -> str:
+    """Hash of the normalized question + options, so reformatted duplicates collapse."""
+    normalized = " | ".join(
+        [_WHITESPACE_RE.sub(" ", question).lower()]
+        + [_WHITESPACE_RE.sub(" ", options[k]).lower() for k in sorted(options)]
+    )
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def row_to_bank_tuple(row: Dict[str, Any], validator) -> tuple | None:
+    """Maps a file row onto the question_bank columns, or returns None if it is invalid."""
+    options = {key: _text(row.get(column)) for key, column in OPTION_COLUMNS.items()}
+    answer = _text(row.get("answer"))
+    # Some banks store the answer as the option text instead of its letter
+    for key, text in options.items():
+        if answer and answer == text:
+            answer = key
+            break
+
+    q = validator.normalize({
+        "type": _text(row.get("type")),
+        "sub_category": _text(row.get("category")) or "General",
+        "question": _text(row.get("question")),
+        "options": options,
+        "answer": answer,
+        "explanation": _text(row.get("explanation")),
+    })
+    if validator.errors(q):
+        return None
+    # Placeholder ("lorem ipsum") or overlong explanations are dropped, not trusted: the row
+    # stays unservable (no ready_seq) until explainer.py writes one that fits
+    if not EXPLANATION_MIN_WORDS <= len(q["explanation"].split()) <= EXPLANATION_MAX_WORDS:
+        q["explanation"] = ""
+    return (
+        q["type"],
+        q["sub_category"],
+        q["question"],
+        json.dumps(q["options"]),
+        q["answer"],
+        q["explanation"],
+        content_hash(q["question"], q["options"]),
+    )
+
+# -------------------------
+# Import driver
+# -------------------------
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+def import_file(path: str, batch_size: int = BATCH_SIZE, restart: bool = False) -> Dict[str, Any]:
+    """Streams path into question_bank in batched transactions and returns a report dict.
+
+    Re-running after an interruption skips the rows already committed, unless
+    the file changed or restart=True. Already-imported questions are never
+    duplicated either way thanks to content_hash.
+    """
+    # The question itself is validated; the explanation is checked separately in row_to_bank_tuple
+    validator = QuestionValidator(min_words=0, max_words=sys.maxsize)
+    source = os.path.basename(path)
+    fingerprint = _fingerprint(path)
+
+    skip = 0
+    progress = None if restart else get_import_progress(source)
+    if progress and progress[0] == fingerprint:
+        skip = progress[1]
+        print(f"{source}: resuming after row {skip}")
+
+    report = {"source": source, "rows": skip, "inserted": 0, "duplicates": 0, "invalid": 0, "seconds": 0.0}
+    start = time.monotonic()
+    rows = islice(read_rows(path), skip, None)
+    next_progress = skip + PROGRESS_EVERY
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch: List[tuple] = []
+        for row in chunk:
+            bank_row = row_to_bank_tuple(row, validator)
+            if bank_row is None:
+                report["invalid"] += 1
+            else:
+                batch.append(bank_row)
+
+        report["rows"] += len(chunk)
+        inserted = insert_bank_batch(source, fingerprint, report["rows"], batch)
+        report["inserted"] += inserted
+        report["duplicates"] += len(batch) - inserted
+
+        if report["rows"] >= next_progress:
+            elapsed = time.monotonic() - start
+            print(f"{source}: {report['rows']} rows ({(report['rows'] - skip) / elapsed:,.0f} rows/sec)")
+            next_progress += PROGRESS_EVERY
+
+    report["seconds"] = time.monotonic() - start
+    report["rows_per_sec"] = (report["rows"] - skip) / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import curated question banks into the 2^two database.")
+    parser.add_argument("files", nargs="+", help="CSV or XLSX files in the csvformat.xlsx layout")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and re-read every row")
+    args = parser.parse_args(argv)
+
+    migrate()
+    for path in args.files:
+        report = import_file(path, batch_size=args.batch_size, restart=args.restart)
+        print(
+            f"{report['source']}: {report['rows']} rows, {report['inserted']} inserted, "
+            f"{report['duplicates']} duplicates, {report['invalid']} invalid "
+            f"in {report['seconds']:.2f}s ({report['rows_per_sec']:,.0f} rows/sec)"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
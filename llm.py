@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Callable, Tuple
+from metrics import inc, observe
+
+# -------------------------
+# Model and API Info
+# -------------------------
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Using the stable, free Deepseek MoE model for strong JSON output
+OPENROUTER_MODEL = "tngtech/deepseek-r1t2-chimera:free"
+# Tried in order (re-ranked by observed latency/success) when the primary model fails
+OPENROUTER_FALLBACK_MODELS = [
+    m.strip() for m in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if m.strip()
+]
+
+# -------------------------
+# Request engine settings
+# -------------------------
+REQUEST_TIMEOUT = (10, 90)      # (connect, read) seconds
+MAX_RETRIES = 2                 # Extra attempts per model for retryable failures
+BACKOFF_BASE_SECONDS = 1.0      # Exponential backoff with jitter: base * 2^attempt
+# Fire a second (hedge) request if the first is slower than this many seconds; None disables
+HEDGE_AFTER_SECONDS = float(os.getenv("OPENROUTER_HEDGE_AFTER", "0")) or None
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Assumed seconds per response for models without data: slower known models get demoted below them
+UNTRIED_MODEL_SCORE = 30.0
+
+# -------------------------
+# Pooled keep-alive session (shared by every thread)
+# -------------------------
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+class RequestFailed(Exception):
+    """A single attempt failed; retryable says whether the same model is worth retrying."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+# -------------------------
+# Per-model latency / success tracking
+# -------------------------
+class ModelStats:
+    """Running success rate and EWMA latency of one model."""
+
+    EWMA_ALPHA = 0.3
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.latency = None   # EWMA of successful call latency in seconds
+
+    def record(self, ok: bool, seconds: float):
+        self.attempts += 1
+        if ok:
+            self.successes += 1
+            self.latency = seconds if self.latency is None else (
+                self.EWMA_ALPHA * seconds + (1 - self.EWMA_ALPHA) * self.latency
+            )
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 1.0
+
+    def score(self) -> float:
+        """Expected seconds per useful response (lower is better)."""
+        if self.latency is None:
+            return UNTRIED_MODEL_SCORE if self.attempts == 0 else float("inf")
+        return self.latency / max(self.success_rate, 0.05)
+
+_stats: Dict[str, ModelStats] = {}
+_stats_lock = threading.Lock()
+
+def _record(model: str, ok: bool, seconds: float):
+    with _stats_lock:
+        _stats.setdefault(model, ModelStats()).record(ok, seconds)
+    outcome = "ok" if ok else "failed"
+    inc("llm_requests_total", model=model, outcome=outcome)
+    observe("llm_request_seconds", seconds, model=model, outcome=outcome)
+
+def record_usage(model: str, usage: Dict[str, Any] | None):
+    """Counts the tokens from a completion's usage block (absent on some providers)."""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = usage.get(kind)
+        if isinstance(tokens, int):
+            inc("llm_tokens_total", tokens, model=model, kind=kind.split("_")[0])
+
+def record_result(model: str, ok: bool, seconds: float):
+    """Feeds an outcome judged outside the engine (e.g. a parsed stream) into the model ranking."""
+    _record(model, ok, seconds)
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of per-model stats (for logging / dashboards)."""
+    with _stats_lock:
+        return {
+            model: {"attempts": s.attempts, "success_rate": s.success_rate, "latency": s.latency}
+            for model, s in _stats.items()
+        }
+
+def ranked_models() -> List[str]:
+    """Primary + fallbacks, best observed first. Ties keep the configured order."""
+    chain = list(dict.fromkeys([OPENROUTER_MODEL] + OPENROUTER_FALLBACK_MODELS))
+    with _stats_lock:
+        scores = {m: _stats[m].score() if m in _stats else UNTRIED_MODEL_SCORE for m in chain}
+    return sorted(chain, key=lambda m: scores[m])
+
+# -------------------------
+# Single attempt
+# -------------------------
+def _post(model: str, headers: Dict[str, str], payload: Dict[str, Any]):
+    body = dict(payload, model=model)
+    try:
+        response = _session.post(OPENROUTER_API_URL, headers=headers, json=body, timeout=REQUEST_TIMEOUT, stream=True)
+    except requests.exceptions.RequestException as e:
+        raise RequestFailed(f"{type(e).__name__}: {e}")
+    if response.status_code >= 400:
+        response.close()
+        raise RequestFailed(f"HTTP Status {response.status_code}", retryable=response.status_code in RETRYABLE_STATUS)
+    return response
+
+def _call_once(model, headers, payload, parse: Callable[[str], Any], cancel: threading.Event):
+    """One blocking completion. Returns parse(content), or None if cancelled."""
+    start = time.monotonic()
+    try:
+        response = _post(model, headers, payload)
+        try:
+            chunks = []
+            # Read incrementally so a losing hedge can abort the transfer by closing the socket
+            for chunk in response.iter_content(chunk_size=8192):
+                if cancel.is_set():
+                    return None
+                chunks.append(chunk)
+        except requests.exceptions.RequestException as e:
+            raise RequestFailed(f"{type(e).__name__}: {e}")
+        finally:
+            response.close()
+        try:
+            data = json.loads(b"".join(chunks))
+            text = data['choices'][0]['message']['content']
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            raise RequestFailed(f"Malformed response body: {type(e).__name__}")
+        # Billed whether or not the content turns out usable
+        record_usage(model, data.get("usage"))
+        result = parse(text)
+        if not result:
+            raise RequestFailed("Response did not contain a usable result")
+    except RequestFailed:
+        _record(model, False, time.monotonic() - start)
+        raise
+    _record(model, True, time.monotonic() - start)
+    return result
+
+def _hedged_call(primary, hedge, headers, payload, parse, before_attempt=None):
+    """Runs primary; if it is still running after HEDGE_AFTER_SECONDS, races hedge against it."""
+    cancel = threading.Event()
+    futures = {_executor.submit(_call_once, primary, headers, payload, parse, cancel): primary}
+    done, _ = wait(futures, timeout=HEDGE_AFTER_SECONDS)
+    if not done and hedge is not None:
+        print(f"Hedging slow request to {primary} with {hedge}")
+        if before_attempt is not None:
+            before_attempt()
+        futures[_executor.submit(_call_once, hedge, headers, payload, parse, cancel)] = hedge
+
+    last_error = None
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except RequestFailed as e:
+                    last_error = e
+                    continue
+                if result:
+                    return result, futures[future]
+    finally:
+        # Tell the losing request to stop reading and drop its connection
+        cancel.set()
+    raise last_error or RequestFailed("All hedged requests were cancelled")
+
+# -------------------------
+# Public API
+# -------------------------
+def chat_completion(headers: Dict[str, str], payload: Dict[str, Any], parse: Callable[[str], Any],
+                    before_attempt: Callable[[], None] | None = None) -> Tuple[Any, str] | None:
+    """Runs the completion through retries, backoff, the fallback chain and optional hedging.
+
+    parse turns the message content into a result; a falsy result counts as a
+    failed attempt. before_attempt, if given, is called before every request
+    sent (retries and hedges included), e.g. to take a rate-limit token.
+    Returns (result, model) for the first valid response, or None.
+    """
+    models = ranked_models()
+    for index, model in enumerate(models):
+        hedge = None
+        if HEDGE_AFTER_SECONDS:
+            # Hedge onto the next-best model, or a second copy of the same one if it is the last
+            hedge = models[index + 1] if index + 1 < len(models) else model
+        for attempt in range(MAX_RETRIES + 1):
+            if before_attempt is not None:
+                before_attempt()
+            try:
+                if hedge is None:
+                    return _call_once(model, headers, payload, parse, threading.Event()), model
+                return _hedged_call(model, hedge, headers, payload, parse, before_attempt)
+            except RequestFailed as e:
+                print(f"OpenRouter request to {model} failed (attempt {attempt + 1}): {e}")
+                if not e.retryable or attempt == MAX_RETRIES:
+                    break
+                time.sleep(BACKOFF_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+    return None
+
+def open_stream(headers: Dict[str, str], payload: Dict[str, Any]):
+    """Opens a streaming completion, walking the retry/fallback chain until one connects.
+
+    Returns (response, model) — the caller must close the response and report the
+    outcome with record_result() — or None.
+    """
+    for model in ranked_models():
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.monotonic()
+            try:
+                response = _post(model, headers, payload)
+                # Success is recorded by the caller once the stream yields something usable
+                return response, model
+            except RequestFailed as e:
+                _record(model, False, time.monotonic() - start)
+                print(f"OpenRouter stream to {model} failed (attempt {attempt + 1}): {e}")
+                if not e.retryable or attempt == MAX_RETRIES:
+                    break
+                time.sleep(BACKOFF_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+    return None
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import inspect
+import tempfile
+import functools
+import threading
+from typing import List, Dict, Any, Callable
+
+# -------------------------
+# Metrics settings (everything below is a no-op unless QUIZ_METRICS is set)
+# -------------------------
+METRICS_ENABLED = os.getenv("QUIZ_METRICS", "").lower() in ("1", "true", "yes", "on")
+METRICS_FILE = os.getenv("QUIZ_METRICS_FILE", "metrics.prom")      # Prometheus text format (textfile collector)
+METRICS_LOG = os.getenv("QUIZ_METRICS_LOG", "")                   # JSON-lines log file; empty = stderr
+SLOW_SPAN_SECONDS = float(os.getenv("QUIZ_METRICS_SLOW_MS", "250")) / 1000   # Spans at least this slow are logged
+EXPORT_INTERVAL_SECONDS = 15
+METRIC_PREFIX = "quiz_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Process-wide registry: (name, sorted label items) -> value / [per-bucket counts..., +Inf count, sum]
+_counters: Dict[tuple, float] = {}
+_histograms: Dict[tuple, List[float]] = {}
+_registry_lock = threading.Lock()
+_log_lock = threading.Lock()
+_exporter_thread = None
+_exporter_lock = threading.Lock()
+
+# -------------------------
+# Recording
+# -------------------------
+def inc(name: str, value: float = 1, **labels):
+    """Adds value to the counter name{labels}."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _registry_lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_exporter()
+
+def observe(name: str, seconds: float, **labels):
+    """Records one duration in the histogram name{labels}."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _registry_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[index] += 1
+        histogram[-1] += seconds
+    _ensure_exporter()
+
+def log_event(event: str, **fields):
+    """Writes one structured (JSON) log line."""
+    if not METRICS_ENABLED:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+    with _log_lock:
+        if METRICS_LOG:
+            with open(METRICS_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        else:
+            print(line, file=sys.stderr)
+
+# -------------------------
+# Spans / timers
+# -------------------------
+class Span:
+    """Times a block (or start..end) into quiz_span_seconds and logs it if slow."""
+
+    __slots__ = ("name", "labels", "start", "finished")
+
+    def __init__(self, name: str, labels: Dict[str, Any]):
+        self.name = name
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.finished = False
+
+    def end(self, outcome: str = "ok"):
+        if self.finished:
+            return
+        self.finished = True
+        seconds = time.perf_counter() - self.start
+        observe("span_seconds", seconds, span=self.name, outcome=outcome, **self.labels)
+        if seconds >= SLOW_SPAN_SECONDS:
+            log_event("slow_span", span=self.name, outcome=outcome, seconds=round(seconds, 4), **self.labels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end("error" if exc_type else "ok")
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def end(self, outcome: str = "ok"):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name: str, **labels):
+    """Starts a span; use as a context manager or call .end() yourself."""
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, labels)
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call; returns the function untouched when metrics are off."""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def instrument_functions(namespace: Dict[str, Any], prefix: str, skip=()):
+    """Wraps every public function defined in a module (pass its globals()) with timed()."""
+    if not METRICS_ENABLED:
+        return
+    module = namespace["__name__"]
+    for name, obj in list(namespace.items()):
+        if (inspect.isfunction(obj) and obj.__module__ == module
+                and not name.startswith("_") and name not in skip):
+            namespace[name] = timed(f"{prefix}.{name}")(obj)
+
+# -------------------------
+# Prometheus text export
+# -------------------------
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def render_prometheus() -> str:
+    """Current counters and histograms in the Prometheus text exposition format."""
+    with _registry_lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric = f"{METRIC_PREFIX}{name}"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (name, labels), values in histograms:
+        metric = f"{METRIC_PREFIX}{name}"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {values[-1]}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_file(path: str | None = None):
+    """Atomically replaces the metrics file, so a scraper never reads half of it."""
+    path = path or METRICS_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render_prometheus())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics file {path}: {e}")
+
+def _export_loop():
+    while True:
+        time.sleep(EXPORT_INTERVAL_SECONDS)
+        write_prometheus_file()
+
+def _ensure_exporter():
+    """Starts the periodic file exporter on first use (once per process)."""
+    global _exporter_thread
+    if _exporter_thread is not None:
+        return
+    with _exporter_lock:
+        if _exporter_thread is None:
+            _exporter_thread = threading.Thread(target=_export_loop, name="metrics-export", daemon=True)
+            _exporter_thread.start()
+            atexit.register(write_prometheus_file)
@@ -0,0 +1,71 @@
+import threading
+from typing import List, Dict, Any
+
+from db import push_pool_set, pop_pool_set, count_pool_sets
+
+# -------------------------
+# Pool settings
+# -------------------------
+POOL_TARGET_SIZE = 3       # Number of ready question sets to keep in SQLite
+POOL_IDLE_SECONDS = 300    # How long the worker sleeps when the pool is full
+POOL_RETRY_SECONDS = 60    # Back-off after a failed generation
+
+# Process-wide worker state (Streamlit reruns app.py, but imported modules persist)
+_worker_thread = None
+_worker_lock = threading.Lock()
+_refill_event = threading.Event()
+
+# -------------------------
+# Worker loop
+# -------------------------
+def _generate_validated_set() -> List[Dict[str, Any]]:
+    """Generates one question set, returning [] unless it is complete and valid."""
+    from questions import get_questions, validate_questions_for_save, missing_slots
+
+    # fallback=False: the pool must never be filled with the sample questions
+    questions = validate_questions_for_save(get_questions(fallback=False))
+    if not questions or any(missing_slots(questions).values()):
+        return []
+    return questions
+
+def _worker_loop():
+    """Keeps the pool topped up to POOL_TARGET_SIZE, then waits for a refill request."""
+    while True:
+        wait_seconds = POOL_IDLE_SECONDS
+        try:
+            while count_pool_sets() < POOL_TARGET_SIZE:
+                questions = _generate_validated_set()
+                if not questions:
+                    print("Prefetch pool: generation failed, retrying later.")
+                    wait_seconds = POOL_RETRY_SECONDS
+                    break
+                push_pool_set(questions)
+        except Exception as e:
+            print(f"Prefetch pool worker error: {e}")
+            wait_seconds = POOL_RETRY_SECONDS
+
+        _refill_event.wait(wait_seconds)
+        _refill_event.clear()
+
+# -------------------------
+# Public helpers for app
+# -------------------------
+def start_prefetch_worker():
+    """Starts the background refill thread once per process."""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(target=_worker_loop, name="question-prefetch", daemon=True)
+            _worker_thread.start()
+
+def request_refill():
+    """Wakes the worker so it replaces sets that were just consumed."""
+    start_prefetch_worker()
+    _refill_event.set()
+
+def take_prefetched_set(refill: bool = True) -> List[Dict[str, Any]] | None:
+    """Pops a ready question set from the pool and, unless refill=False, schedules a refill."""
+    questions = pop_pool_set()
+    if refill:
+        request_refill()
+    return questions
@@ -0,0 +1,58 @@
+import streamlit as st
+
+from db import search_questions, get_practice_topics
+
+# -------------------------
+# Practice mode settings
+# -------------------------
+PRACTICE_PAGE_SIZE = 10
+PRACTICE_SOURCE_LABELS = {"bank": "Question bank", "archive": "Past daily quizzes"}
+
+def _reset_page():
+    st.session_state.practice_page = 0
+
+# -------------------------
+# Practice page (search + topic browsing over the FTS index)
+# -------------------------
+def render_practice_page() -> bool:
+    """Searchable, paginated practice questions; answers here are not recorded.
+
+    Returns True when the page changed and the caller should st.rerun().
+    """
+    if 'practice_page' not in st.session_state:
+        st.session_state.practice_page = 0
+
+    st.subheader("Practice")
+    source = st.radio(
+        "Questions from:", list(PRACTICE_SOURCE_LABELS),
+        format_func=PRACTICE_SOURCE_LABELS.get, horizontal=True, on_change=_reset_page
+    )
+    query = st.text_input("Search questions", placeholder="e.g. probability dice, deadlock", on_change=_reset_page)
+    topics = get_practice_topics(source)
+    topic = st.selectbox(
+        "Topic", [None] + [name for name, _ in topics],
+        format_func=lambda name: "All topics" if name is None else f"{name} ({dict(topics)[name]})",
+        on_change=_reset_page
+    )
+
+    page = st.session_state.practice_page
+    results, has_more = search_questions(query, topic, source, PRACTICE_PAGE_SIZE, page * PRACTICE_PAGE_SIZE)
+    if not results:
+        st.write("No matching questions." if query or topic else "No questions available yet.")
+
+    for number, q in enumerate(results, start=page * PRACTICE_PAGE_SIZE + 1):
+        with st.expander(f"{number}. {q['question']}"):
+            st.caption(f"{q['type'].title()} · {q['sub_category']}")
+            for key, val in q["options"].items():
+                st.write(f"{key}: {val}")
+            st.write(f"**Answer:** {q['answer']}: {q['options'].get(q['answer'], '')}")
+            st.write("Explanation:", q["explanation"])
+
+    prev_col, next_col = st.columns(2)
+    if page > 0 and prev_col.button("Previous page"):
+        st.session_state.practice_page -= 1
+        return True
+    if has_more and next_col.button("Next page"):
+        st.session_state.practice_page += 1
+        return True
+    return False
@@ -1,17 +1,20 @@
 import os
+import re
 import json
 import random
+import time
 import uuid
+from string import Template
 import requests
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator
 
 # -------------------------
-# Model and API Info
+# Model and API Info (request engine lives in llm.py)
 # -------------------------
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
-# Using the stable, free Deepseek MoE model for strong JSON output
-OPENROUTER_MODEL = "tngtech/deepseek-r1t2-chimera:free" 
+from llm import OPENROUTER_API_URL, OPENROUTER_MODEL, chat_completion, open_stream, record_usage, record_result
+from dedup import find_near_duplicate, repeats_any
+from metrics import METRICS_ENABLED, inc, log_event, timed
 
 # Global variable to cache the API key after loading
 _OPENROUTER_API_KEY = None 
@@ -27,14 +30,20 @@ def get_api_key():
         _OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     return _OPENROUTER_API_KEY
 
+# -------------------------
+# Daily question mix (also used to re-request only the missing questions)
+# -------------------------
+QUESTION_MIX = {"aptitude": 2, "technical": 2}
+REPAIR_ROUNDS = 2   # Extra calls allowed to fill slots whose questions were missing, invalid or repeats
+
 # -------------------------
 # Prompt for MCQs (FIXED to enforce A, B, C, D order)
 # -------------------------
-PROMPT = """
-Generate exactly 4 multiple-choice questions for CSE technical interview level:
+PROMPT_TEMPLATE = Template("""
+Generate exactly $total multiple-choice questions for CSE technical interview level:
 
-- 2 aptitude questions: Focused on **Quantitative Ability and Logical Reasoning** from the following topics: Sequences & Series, Permutations & Combinations, Probability, Geometry, Mensuration, Statistics, Blood Relations, Directions, Clocks & Calendars, Cubes, Coding & Decoding, Cryptarithmetic, and Non Verbal Reasoning.
-- 2 technical questions: Focused on **Core Computer Science** concepts such as Data Structures, Algorithms, Operating Systems, and Database Management Systems.
+- $aptitude aptitude questions: Focused on **Quantitative Ability and Logical Reasoning** from the following topics: Sequences & Series, Permutations & Combinations, Probability, Geometry, Mensuration, Statistics, Blood Relations, Directions, Clocks & Calendars, Cubes, Coding & Decoding, Cryptarithmetic, and Non Verbal Reasoning.
+- $technical technical questions: Focused on **Core Computer Science** concepts such as Data Structures, Algorithms, Operating Systems, and Database Management Systems.
 
 Requirements:
 
@@ -63,18 +72,24 @@ Requirements:
 ]
 
 Do not include any text outside the JSON.
-"""
+""")
+
+def build_prompt(aptitude: int = 2, technical: int = 2) -> str:
+    return PROMPT_TEMPLATE.substitute(total=aptitude + technical, aptitude=aptitude, technical=technical)
+
+PROMPT = build_prompt(**QUESTION_MIX)
 
 # -------------------------
-# Generate questions from OpenRouter (Shuffling logic removed, Prompt trusts LLM)
+# Request builder shared by the blocking and streaming calls
 # -------------------------
-def generate_questions() -> List[Dict[str, Any]] | None:
+def build_request(stream: bool = False, aptitude: int = 2, technical: int = 2):
+    """Returns (headers, payload) for one generation call, or None without an API key."""
     OPENROUTER_API_KEY = get_api_key()
     if not OPENROUTER_API_KEY:
         print("InferenceClient not initialized. Check OPENROUTER_API_KEY.")
         return None
     
-    unique_prompt = PROMPT + f"\n\n--- Request Seed: {uuid.uuid4()} ---"
+    unique_prompt = build_prompt(aptitude, technical) + f"\n\n--- Request Seed: {uuid.uuid4()} ---"
 
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -82,8 +97,8 @@ def generate_questions() -> List[Dict[str, Any]] | None:
         "HTTP-Referer": "http://localhost" # Placeholder for local development
     }
 
+    # "model" is filled in per attempt by the request engine (fallback chain / hedging)
     payload = {
-        "model": OPENROUTER_MODEL,
         "response_format": {"type": "json_object"}, 
         "messages": [
             {"role": "system", "content": "You are an expert quiz generator. Your response must be a valid JSON array, strictly adhering to the user's required structure."},
@@ -92,42 +107,224 @@ def generate_questions() -> List[Dict[str, Any]] | None:
         "temperature": 0.7,
         "max_tokens": 3000 
     }
+    if stream:
+        payload["stream"] = True
+        # Ask for the final usage chunk (token counts) that non-streamed responses always carry
+        payload["usage"] = {"include": True}
+    return headers, payload
+
+# -------------------------
+# Generate questions from OpenRouter (Shuffling logic removed, Prompt trusts LLM)
+# -------------------------
+@timed("questions.generate_questions")
+def generate_questions(aptitude: int = 2, technical: int = 2) -> List[Dict[str, Any]] | None:
+    request = build_request(aptitude=aptitude, technical=technical)
+    if request is None:
+        return None
+    headers, payload = request
     
-    text = ""
     try:
-        response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload, timeout=90) 
-        response.raise_for_status() 
-        data = response.json()
-        
-        text = data['choices'][0]['message']['content']
-        
-        # Robust JSON cleanup
-        if text.strip().startswith("```json"):
-            text = text.strip().strip("```json").strip("```")
-            
-        json_start = text.find('[')
-        json_end = text.rfind(']')
-        if json_start == -1 or json_end == -1:
-             raise ValueError(f"Could not find valid JSON array boundaries ([...]) in LLM output. Output length: {len(text)}")
-        text = text[json_start : json_end + 1]
-        
-        questions = json.loads(text)
+        # Retries, fallback models and hedging are handled by the engine; a response only
+        # counts as successful if at least one complete question can be salvaged from it
+        result = chat_completion(headers, payload, parse=salvage_questions)
+        if result is None:
+            print("OpenRouter API Error: every model in the fallback chain failed.")
+            return None
+        questions, _ = result
         
         # NOTE: Client-side shuffling logic removed entirely, relying on LLM randomization (Prompt Requirement #2)
             
         return questions
     
-    except requests.exceptions.RequestException as e:
-        status_code = getattr(e.response, 'status_code', 'N/A')
-        print(f"OpenRouter API Error: HTTP Status {status_code}. Reason: {e}")
-        return None
-    except (json.JSONDecodeError, ValueError, KeyError) as e:
-        print(f"Error parsing model output: {type(e).__name__}. RAW OUTPUT: {text}")
-        return None
     except Exception as e:
         print(f"Unexpected generation error: {e}")
         return None
 
+# -------------------------
+# Incremental JSON array parser (yields each question object as soon as it closes)
+# -------------------------
+class IncrementalArrayParser:
+    """Consumes a JSON array in arbitrary text chunks and emits its top-level objects.
+
+    Text before the opening '[' (e.g. a ```json fence) is ignored, and only the
+    object currently being read is buffered.
+    """
+
+    def __init__(self):
+        self._buffer = []          # Characters of the object currently open
+        self._depth = 0            # Bracket depth; 1 = inside the top-level array
+        self._in_string = False
+        self._escaped = False
+        self.done = False          # True once the closing ']' of the array was seen
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._depth == 0:
+                if ch == '[':
+                    self._depth = 1
+                continue
+
+            if self._depth >= 2:
+                self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if self._depth == 1:
+                    self._buffer = [ch]
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1:
+                    try:
+                        obj = json.loads("".join(self._buffer))
+                        if isinstance(obj, dict):
+                            completed.append(obj)
+                    except json.JSONDecodeError as e:
+                        print(f"Skipping unparsable streamed object: {e}")
+                    self._buffer = []
+                elif self._depth == 0:
+                    self.done = True
+        return completed
+
+# -------------------------
+# Salvage-and-repair parsing of complete (non-streamed) output
+# -------------------------
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+def _json_start(text: str) -> int:
+    """Index of the first '[' or '{' outside a string literal, or -1.
+
+    Brackets inside question text ("int a[5]", an option "[1,2,3]") must not be
+    mistaken for the start of the array.
+    """
+    in_string = escaped = False
+    for index, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '[{':
+            return index
+    return -1
+
+def salvage_questions(text: str) -> List[Dict[str, Any]]:
+    """Recovers every well-formed question object from the model output.
+
+    Tries a strict parse of the outermost [...] (or {...}, for json_object
+    replies) first. Otherwise strips trailing commas and runs the incremental
+    parser, which keeps each object that closed before the output was cut off
+    or broke.
+    """
+    text = text.strip()
+    json_start = _json_start(text)
+    if json_start != -1:
+        closer = ']' if text[json_start] == '[' else '}'
+        json_end = text.rfind(closer)
+        if json_end > json_start:
+            try:
+                data = json.loads(text[json_start : json_end + 1])
+            except json.JSONDecodeError:
+                data = None
+            if isinstance(data, dict):
+                # A single question, or the array wrapped in an object ({"questions": [...]})
+                lists = [v for v in data.values() if isinstance(v, list)]
+                data = lists[0] if "question" not in data and len(lists) == 1 else [data]
+            if isinstance(data, list):
+                return [q for q in data if isinstance(q, dict)]
+
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", text)
+    recovered = []
+    if json_start != -1 and text[json_start] == '{':
+        # Model skipped the array brackets and emitted bare objects
+        recovered = IncrementalArrayParser().feed("[" + repaired[json_start:])
+        recovered = [q for q in recovered if "question" in q]
+    if not recovered:
+        # The parser starts at the first '[' (also covers a truncated wrapper object)
+        recovered = IncrementalArrayParser().feed(repaired)
+    if recovered:
+        print(f"Salvaged {len(recovered)} question(s) from malformed model output.")
+    return recovered
+
+# -------------------------
+# Streaming generation via OpenRouter server-sent events
+# -------------------------
+def _iter_stream_content(response, model: str):
+    """Yields the content deltas of an OpenAI-style SSE completion stream (and records its usage chunk)."""
+    # SSE is always UTF-8; without a charset requests would decode text/event-stream as ISO-8859-1
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        # Blank lines separate events; lines starting with ':' are keep-alive comments
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        chunk = json.loads(data)
+        record_usage(model, chunk.get("usage"))
+        choices = chunk.get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+def stream_questions() -> Iterator[Dict[str, Any]]:
+    """Streams the completion and yields each raw question dict as soon as it is complete."""
+    request = build_request(stream=True)
+    if request is None:
+        return
+    headers, payload = request
+
+    opened = open_stream(headers, payload)
+    if opened is None:
+        print("OpenRouter API Error (stream): every model in the fallback chain failed.")
+        return
+    response, model = opened
+
+    # A stream only counts as a model success once it produced a question (time to first byte + parse)
+    start = time.monotonic() - response.elapsed.total_seconds()
+    parsed = 0
+    parser = IncrementalArrayParser()
+    try:
+        with response:
+            for content in _iter_stream_content(response, model):
+                if parser.done:
+                    # Only reached with metrics on: drain the tail for the trailing usage chunk
+                    continue
+                for q in parser.feed(content):
+                    if not parsed:
+                        record_result(model, True, time.monotonic() - start)
+                    parsed += 1
+                    yield q
+                if parser.done and not METRICS_ENABLED:
+                    break
+    except requests.exceptions.RequestException as e:
+        print(f"OpenRouter API Error (stream from {model}): {e}")
+    except (json.JSONDecodeError, ValueError, KeyError) as e:
+        print(f"Error parsing stream event: {type(e).__name__}: {e}")
+    except Exception as e:
+        print(f"Unexpected streaming error: {e}")
+    finally:
+        if not parsed:
+            record_result(model, False, time.monotonic() - start)
+
 # -------------------------
 # Fallback sample questions (UPDATED with detailed explanations)
 # -------------------------
@@ -170,28 +367,204 @@ def generate_sample_questions() -> List[Dict[str, Any]]:
 # -------------------------
 # Parse / normalize questions
 # -------------------------
+def parse_question(q: Dict[str, Any], idx: int) -> Dict[str, Any]:
+    return {
+        "id": idx + 1,
+        "type": q.get("type", "unknown"),
+        "sub_category": q.get("sub_category", "General"), 
+        "question": q.get("question", ""),
+        "options": q.get("options", {}),
+        "answer": q.get("answer", ""),
+        "explanation": q.get("explanation", "")
+    }
+
 def parse_questions(raw_questions: List[Dict[str, Any]]):
     if not raw_questions:
         return []
-    parsed = []
-    for idx, q in enumerate(raw_questions):
-        parsed.append({
-            "id": idx + 1,
-            "type": q.get("type", "unknown"),
-            "sub_category": q.get("sub_category", "General"), 
-            "question": q.get("question", ""),
-            "options": q.get("options", {}),
-            "answer": q.get("answer", ""),
-            "explanation": q.get("explanation", "")
-        })
-    return parsed
+    return [parse_question(q, idx) for idx, q in enumerate(raw_questions)]
+
+# -------------------------
+# Compiled question schema
+# -------------------------
+EXPLANATION_MIN_WORDS = 40   # Prompt asks for 50-100; models miscount, so allow some slack
+EXPLANATION_MAX_WORDS = 130
+
+class QuestionValidator:
+    """Schema for one question, built once and reused for every check."""
+
+    def __init__(self, types=QUESTION_MIX.keys(), option_keys="ABCD",
+                 min_words=EXPLANATION_MIN_WORDS, max_words=EXPLANATION_MAX_WORDS):
+        self.types = frozenset(types)
+        self.option_keys = frozenset(option_keys)
+        self.min_words = min_words
+        self.max_words = max_words
+        self._word_re = re.compile(r"\S+")
+
+    def normalize(self, q: Dict[str, Any]) -> Dict[str, Any]:
+        """Fixes harmless formatting drift (case, whitespace, 'B)' style answers)."""
+        q = dict(q)
+        if isinstance(q.get("type"), str):
+            q["type"] = q["type"].strip().lower()
+        if isinstance(q.get("answer"), str):
+            q["answer"] = q["answer"].strip().upper()[:1]
+        if isinstance(q.get("options"), dict):
+            q["options"] = {str(k).strip().upper(): v for k, v in sorted(q["options"].items())}
+        return q
+
+    def errors(self, q: Dict[str, Any]) -> List[str]:
+        """Returns the list of schema violations (empty if the question is valid)."""
+        problems = []
+        if q.get("type") not in self.types:
+            problems.append(f"type {q.get('type')!r} not in {sorted(self.types)}")
+        for key in ("sub_category", "question"):
+            if not isinstance(q.get(key), str) or not q[key].strip():
+                problems.append(f"missing {key}")
+        options = q.get("options")
+        if not isinstance(options, dict) or set(options) != self.option_keys:
+            problems.append("options must have exactly the keys A-D")
+        elif not all(isinstance(v, str) and v.strip() for v in options.values()):
+            problems.append("empty option text")
+        elif q.get("answer") not in options:
+            problems.append(f"answer {q.get('answer')!r} is not an option")
+        explanation = q.get("explanation")
+        words = len(self._word_re.findall(explanation)) if isinstance(explanation, str) else 0
+        if not self.min_words <= words <= self.max_words:
+            problems.append(f"explanation has {words} words")
+        return problems
+
+QUESTION_VALIDATOR = QuestionValidator()
+
+# -------------------------
+# Data Validation Utility
+# -------------------------
+def validate_questions_for_save(questions_list):
+    """Keeps only questions that satisfy the compiled schema (normalized in passing)."""
+    valid_questions = []
+    
+    for q in questions_list:
+        q = QUESTION_VALIDATOR.normalize(q)
+        problems = QUESTION_VALIDATOR.errors(q)
+        if not problems:
+            valid_questions.append(q)
+        else:
+            print(f"Skipping malformed question: {'; '.join(problems)}")
+            
+    return valid_questions
+
+def missing_slots(valid_questions: List[Dict[str, Any]]) -> Dict[str, int]:
+    """How many questions of each type are still needed to complete QUESTION_MIX."""
+    return {
+        qtype: max(0, count - sum(1 for q in valid_questions if q["type"] == qtype))
+        for qtype, count in QUESTION_MIX.items()
+    }
+
+def _fill_slots(valid_questions, candidates, repeats=None):
+    """Adds validated, novel candidates to the set, never exceeding QUESTION_MIX per type.
+
+    Candidates rejected as repeats of served questions are appended to repeats, if given.
+    """
+    needed = missing_slots(valid_questions)
+    for q in validate_questions_for_save(candidates):
+        if needed.get(q["type"], 0) <= 0:
+            continue
+        # The free model repeats itself; near-duplicates of served questions leave the slot open
+        duplicate_of = find_near_duplicate(q["question"], [v["question"] for v in valid_questions])
+        if duplicate_of is not None:
+            print(f"Skipping near-duplicate question (of {duplicate_of or 'this set'}): {q['question'][:60]}")
+            if duplicate_of and repeats is not None:
+                repeats.append(q)
+            continue
+        needed[q["type"]] -= 1
+        valid_questions.append(q)
+    return valid_questions
+
+def _repair_slots(valid_questions, repeats=None):
+    """Re-requests only the still-missing slots, up to REPAIR_ROUNDS times."""
+    rounds = 0
+    while rounds < REPAIR_ROUNDS and any(missing_slots(valid_questions).values()):
+        rounds += 1
+        needed = missing_slots(valid_questions)
+        print(f"Re-requesting missing questions: {needed}")
+        extra = generate_questions(**needed)
+        if not extra:
+            break
+        _fill_slots(valid_questions, extra, repeats)
+    return valid_questions
+
+def _fill_with_repeats(valid_questions, repeats):
+    """Last resort for slots the repair rounds couldn't fill: a repeat beats a short set."""
+    needed = missing_slots(valid_questions)
+    for q in repeats:
+        if needed.get(q["type"], 0) <= 0 or repeats_any(q["question"], [v["question"] for v in valid_questions]):
+            continue
+        print(f"Reusing near-duplicate question to complete the set: {q['question'][:60]}")
+        needed[q["type"]] -= 1
+        valid_questions.append(q)
+    return valid_questions
+
+def _in_mix_order(valid_questions):
+    # Keep the app's aptitude-then-technical order regardless of which round produced a question
+    order = list(QUESTION_MIX)
+    return sorted(valid_questions, key=lambda q: order.index(q["type"]) if q["type"] in order else len(order))
+
+def replace_near_duplicates(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Re-checks a stored (prefetched) set against the history before it is served.
+
+    Slots whose question has been served since the set was generated are
+    regenerated on their own; returns [] if the set can't be completed.
+    """
+    valid = _repair_slots(_fill_slots([], questions))
+    if any(missing_slots(valid).values()):
+        return []
+    return parse_questions(_in_mix_order(valid))
 
 # -------------------------
 # Convenience function for app
 # -------------------------
-def get_questions():
-    raw = generate_questions()
-    if not raw:
+@timed("questions.get_questions")
+def get_questions(fallback: bool = True, on_question: Callable[[Dict[str, Any]], None] | None = None):
+    """Generates a normalized, validated question set.
+
+    Any questions missing after validation or rejected as near-duplicates of
+    served questions are re-requested on their own (up to
+    REPAIR_ROUNDS times) instead of regenerating the whole set; slots still
+    open after that reuse the near-duplicates rather than publish a short set.
+    With fallback=False an API failure returns an empty list instead of the
+    sample questions, so callers that fill caches never store the samples.
+    With on_question the completion is streamed and each valid question is
+    passed to the callback as soon as it arrives.
+    """
+    valid, repeats = [], []
+    if on_question is None:
+        raw = generate_questions()
+        _fill_slots(valid, raw or [], repeats)
+    else:
+        raw = []
+        for q in stream_questions():
+            raw.append(q)
+            before = len(valid)
+            _fill_slots(valid, [q], repeats)
+            if len(valid) > before:
+                on_question(parse_question(valid[-1], before))
+        if not raw:
+            # Garbage or empty stream: the blocking engine still has retries and fallback models
+            print("Stream produced no questions; retrying without streaming.")
+            raw = generate_questions()
+            for q in raw or []:
+                before = len(valid)
+                _fill_slots(valid, [q], repeats)
+                if len(valid) > before:
+                    on_question(parse_question(valid[-1], before))
+
+    # raw is None only when the API itself failed; retrying for missing slots won't help then
+    if raw is not None:
+        _fill_with_repeats(_repair_slots(valid, repeats), repeats)
+
+    if not valid:
+        if not fallback:
+            return []
         # If API fails, raw is None, so we get samples
-        raw = generate_sample_questions()
-    return parse_questions(raw)
+        inc("sample_fallback_total")
+        log_event("sample_fallback", api_failed=raw is None)
+        valid = generate_sample_questions()
+    return parse_questions(_in_mix_order(valid))
@@ -0,0 +1,99 @@
+import datetime
+import random
+import threading
+from typing import List, Dict, Any, Tuple
+
+from db import get_ready_bank_ids, get_served_bank_ids, get_bank_questions
+
+# -------------------------
+# Selection settings
+# -------------------------
+# Relative weight of each (category, sub_category) stratum; topics not listed weigh 1.0
+TOPIC_WEIGHTS: Dict[Tuple[str, str], float] = {}
+EXCLUDE_DAYS = 60          # Don't re-serve a bank question picked within this many days
+MAX_DRAWS_PER_SLOT = 64    # Rejection-sampling budget per slot before giving up on the bank
+SEED_SALT = "2two-daily"   # Part of the per-date seed; change it to reshuffle every future day
+
+# -------------------------
+# Precomputed per-topic ID arrays
+# -------------------------
+class SelectionIndex:
+    """In-memory id arrays per (category, sub_category) over servable bank rows.
+
+    Arrays are appended in ready_seq order, so two replicas refreshed to the same
+    point hold identical arrays and draw identical picks for the same seed.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, Dict[str, List[int]]] = {}   # category -> sub_category -> ids
+        self._last_seq = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Appends rows that became servable since the last refresh (one indexed range query)."""
+        with self._lock:
+            rows = get_ready_bank_ids(self._last_seq)
+            for ready_seq, bank_id, category, sub_category in rows:
+                self._ids.setdefault(category, {}).setdefault(sub_category, []).append(bank_id)
+                self._last_seq = ready_seq
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(ids) for topics in self._ids.values() for ids in topics.values())
+
+    def pick(self, date: str, plan: Dict[str, int], exclude_days: int = EXCLUDE_DAYS) -> List[int] | None:
+        """Draws plan[category] ids per category for date, or None if the bank can't fill the plan.
+
+        Each draw is a weighted choice over the category's topics followed by a
+        uniform index into that topic's array, so cost doesn't grow with the pool.
+        """
+        day = datetime.date.fromisoformat(date)
+        # The day itself is included so a regeneration never repeats the set it replaces
+        excluded = get_served_bank_ids((day - datetime.timedelta(days=exclude_days)).isoformat(), date)
+        rng = random.Random(f"{SEED_SALT}:{date}")
+
+        picked: List[int] = []
+        with self._lock:
+            for category, count in plan.items():
+                topics = sorted(self._ids.get(category, {}).items())
+                used_topics = set()
+                for _ in range(count):
+                    bank_id = self._draw(rng, category, topics, used_topics, excluded, picked)
+                    if bank_id is None:
+                        return None
+                    picked.append(bank_id)
+        return picked
+
+    def _draw(self, rng, category, topics, used_topics, excluded, picked):
+        # Prefer a topic not used yet today so the two questions of a category differ
+        candidates = [(name, ids) for name, ids in topics if ids and name not in used_topics]
+        if not candidates:
+            candidates = [(name, ids) for name, ids in topics if ids]
+        if not candidates:
+            return None
+        weights = [TOPIC_WEIGHTS.get((category, name), 1.0) for name, _ in candidates]
+
+        for _ in range(MAX_DRAWS_PER_SLOT):
+            name, ids = rng.choices(candidates, weights=weights)[0]
+            bank_id = ids[rng.randrange(len(ids))]
+            if bank_id not in excluded and bank_id not in picked:
+                used_topics.add(name)
+                return bank_id
+        return None
+
+# Process-wide index shared by every session
+_index = SelectionIndex()
+
+# -------------------------
+# Public API
+# -------------------------
+def pick_bank_questions(date: str, plan: Dict[str, int] | None = None) -> List[Dict[str, Any]]:
+    """Returns the deterministic bank set for date (tagged with bank_id), or [] if the bank can't fill it."""
+    if plan is None:
+        from questions import QUESTION_MIX
+        plan = QUESTION_MIX
+    _index.refresh()
+    ids = _index.pick(date, plan)
+    if not ids:
+        return []
+    return get_bank_questions(ids)
@@ -0,0 +1,76 @@
+import os
+import json
+import tempfile
+import threading
+from typing import List, Dict, Any
+
+# -------------------------
+# Snapshot settings
+# -------------------------
+# One pre-parsed JSON file per day; static replicas only need this directory, not the DB
+SNAPSHOT_DIR = os.getenv("QUIZ_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_FORMAT = 1
+
+# Parsed snapshots keyed by path, validated against the file's mtime so a republish is picked up
+_loaded: Dict[str, tuple] = {}
+_loaded_lock = threading.Lock()
+
+def snapshot_path(date: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"quiz-{date}.json")
+
+# -------------------------
+# Publish
+# -------------------------
+def write_snapshot(date: str, questions: List[Dict[str, Any]]):
+    """Atomically writes the day's validated set; readers see the old file or the new one, never a partial one."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    body = json.dumps(
+        {"format": SNAPSHOT_FORMAT, "date": date, "questions": questions},
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=f".quiz-{date}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; replicas serving the directory need to read them
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, snapshot_path(date))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# -------------------------
+# Read
+# -------------------------
+def load_snapshot(date: str) -> List[Dict[str, Any]] | None:
+    """Returns the day's questions from its snapshot file, or None if there is no usable snapshot."""
+    path = snapshot_path(date)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if data.get("format") != SNAPSHOT_FORMAT or data.get("date") != date or not data.get("questions"):
+        return None
+
+    with _loaded_lock:
+        # Only today's/future snapshots are worth keeping around
+        for old_path in [p for p in _loaded if p < path]:
+            del _loaded[old_path]
+        _loaded[path] = (mtime, data["questions"])
+    return data["questions"]